@@ -0,0 +1,202 @@
+"""Compile (phrase, label) annotations into spaCy training data
+
+Instead of looking up every phrase with `txt.find(key)` like helper.py, this
+takes a list of (phrase, label) pairs per article and finds every occurrence
+of all of them in a single pass over the text, using an Aho-Corasick
+automaton. Matches have to start and end on word boundaries.
+
+Overlapping spans can't be used for training, so they are reported and
+resolved: spans with the same offsets but different labels are conflicts and
+are dropped, otherwise the longest span wins.
+
+The input is a JSONL file with one object per article:
+
+    {"article": 0, "phrases": [["The Battle of Waterloo", "BATTLE"],
+                               ["Napoleon Bonaparte", "LEADER"]]}
+
+where "article" is the index of the article in the corpus file (or "text"
+gives the text directly). The output is JSONL in the format spaCy's
+training examples use:
+
+    ["The Battle of Waterloo was fought ...", {"entities": [[0, 22, "BATTLE"]]}]
+
+    python annotate.py phrases.jsonl train.jsonl -c Training.txt
+"""
+from __future__ import unicode_literals, print_function
+
+import io
+import json
+import plac
+import sys
+from collections import deque
+from pathlib import Path
+
+from corpus import Corpus
+
+
+def fold(text):
+    """Lower-case `text` one character at a time. Returns the folded string
+    and, for each of its characters, the offset in `text` it came from:
+    lower() can turn one character into two ('\u0130' -> 'i\u0307')."""
+    folded = []
+    origin = []
+    for i, char in enumerate(text):
+        lowered = char.lower()
+        folded.append(lowered)
+        origin.extend([i] * len(lowered))
+    return ''.join(folded), origin
+
+
+class PhraseAutomaton(object):
+    """Aho-Corasick automaton over a set of phrases."""
+
+    def __init__(self, phrases, ignore_case=False):
+        self.ignore_case = ignore_case
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for phrase in phrases:
+            self._add(phrase)
+        self._link()
+
+    def _add(self, phrase):
+        key = fold(phrase)[0] if self.ignore_case else phrase
+        if not key:
+            return
+        state = 0
+        for char in key:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        if (phrase, len(key)) not in self.output[state]:
+            self.output[state].append((phrase, len(key)))
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(char, 0)
+                self.output[next_state] = (self.output[next_state] +
+                                           self.output[self.fail[next_state]])
+
+    def finditer(self, text):
+        """Yield (start, end, phrase) for every occurrence of every phrase.
+        The offsets are in `text`, also when folding changed its length."""
+        if self.ignore_case:
+            haystack, origin = fold(text)
+        else:
+            haystack, origin = text, None
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for i, char in enumerate(haystack):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for phrase, length in output[state]:
+                if origin is None:
+                    yield i + 1 - length, i + 1, phrase
+                else:
+                    yield origin[i + 1 - length], origin[i] + 1, phrase
+
+
+def _is_boundary(text, i):
+    return i <= 0 or i >= len(text) or not (text[i - 1].isalnum() and
+                                             text[i].isalnum())
+
+
+def compile_spans(text, phrases, ignore_case=False):
+    """Resolve a list of (phrase, label) pairs to character offsets in `text`.
+
+    Returns (entities, problems): the non-overlapping (start, end, label)
+    spans, sorted by offset, and a list of messages about phrases that were
+    not found and spans that were dropped.
+    """
+    labels = {}
+    problems = []
+    for phrase, label in phrases:
+        labels.setdefault(phrase, set()).add(label)
+    automaton = PhraseAutomaton(labels, ignore_case=ignore_case)
+    found = set()
+    by_offsets = {}
+    for start, end, phrase in automaton.finditer(text):
+        if not (_is_boundary(text, start) and _is_boundary(text, end)):
+            continue
+        found.add(phrase)
+        by_offsets.setdefault((start, end), set()).update(labels[phrase])
+    for phrase in labels:
+        if phrase not in found:
+            problems.append("not found: %r" % phrase)
+
+    candidates = []
+    for (start, end), span_labels in by_offsets.items():
+        if len(span_labels) > 1:
+            problems.append("conflict: %r labelled %s" % (
+                text[start:end], ', '.join(sorted(span_labels))))
+            continue
+        candidates.append((start, end, span_labels.pop()))
+
+    # longest spans first, then leftmost
+    candidates.sort(key=lambda span: (span[0] - span[1], span[0]))
+    taken = []
+    entities = []
+    for span in candidates:
+        clash = [other for other in taken
+                 if other[0] < span[1] and span[0] < other[1]]
+        if clash:
+            problems.append("overlap: %r (%s) inside %r (%s)" % (
+                text[span[0]:span[1]], span[2],
+                text[clash[0][0]:clash[0][1]], clash[0][2]))
+            continue
+        taken.append(span)
+        entities.append(span)
+    entities.sort()
+    return entities, problems
+
+
+@plac.annotations(
+    input_path=("JSONL file with the phrases of every article", "positional", None, Path),
+    output_path=("Where to write the training data (JSONL)", "positional", None, Path),
+    corpus_path=("Corpus the article indices refer to", "option", "c", Path),
+    ignore_case=("Match phrases case-insensitively", "flag", "i", bool))
+
+def main(input_path, output_path, corpus_path=None, ignore_case=False):
+    corpus = Corpus(corpus_path) if corpus_path is not None else None
+    n_articles = n_entities = n_problems = 0
+    with io.open(str(input_path), encoding='utf8') as input_, \
+            io.open(str(output_path), 'w', encoding='utf8') as output:
+        for line in input_:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'text' in record:
+                text = record['text']
+            elif corpus is not None:
+                text = corpus[record['article']]
+            else:
+                raise ValueError("article %r has no text and no corpus was "
+                                 "given" % record.get('article'))
+            entities, problems = compile_spans(text, record['phrases'],
+                                               ignore_case=ignore_case)
+            for problem in problems:
+                print("article %s: %s" % (record.get('article', n_articles),
+                                          problem), file=sys.stderr)
+            output.write(json.dumps([text, {'entities': entities}]) + '\n')
+            n_articles += 1
+            n_entities += len(entities)
+            n_problems += len(problems)
+    print("%d articles, %d entities, %d problems" % (
+        n_articles, n_entities, n_problems))
+
+
+if __name__ == '__main__':
+    plac.call(main)
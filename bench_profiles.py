@@ -0,0 +1,83 @@
+"""Compare the speed and accuracy of saved models
+
+For every model directory given (e.g. Aici and a student trained with
+distill.py), prints its size on disk, load time, docs/sec and words/sec
+over Training.txt and Test.txt repeated `scale` times, and the per-label
+exact F1 on Test.txt, so the right speed/accuracy point can be picked per
+workload.
+
+    python bench_profiles.py Aici Aici-fast -s 10 -o profiles.json
+"""
+from __future__ import unicode_literals, print_function
+
+import io
+import json
+import os
+import plac
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import spacy
+
+from corpus import Corpus
+from evaluation import Scorer, doc_spans
+from historical_battle import LABELS, evaluation_examples
+
+
+def disk_size(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, dirs, files in os.walk(str(path)) for name in files)
+
+
+def bench_model(model, texts, examples, batch_size=64):
+    result = OrderedDict()
+    result['size_mb'] = disk_size(model) / (1024.0 * 1024.0)
+    start = time.time()
+    nlp = spacy.load(model)
+    result['load_sec'] = time.time() - start
+    n_words = sum(len(text.split()) for text in texts)
+    start = time.time()
+    for doc in nlp.pipe(texts, batch_size=batch_size):
+        pass
+    elapsed = time.time() - start
+    result['docs_per_sec'] = len(texts) / elapsed if elapsed else 0.0
+    result['words_per_sec'] = n_words / elapsed if elapsed else 0.0
+    scorer = Scorer()
+    for (text, gold), doc in zip(examples, nlp.pipe(
+            [text for text, _ in examples], batch_size=batch_size)):
+        scorer.score(gold, doc_spans(doc))
+    scores = scorer.scores()
+    for label in LABELS + ['ALL']:
+        result['f1_%s' % label] = (scores[label]['exact']['f'] * 100
+                                   if label in scores else 0.0)
+    return result
+
+
+@plac.annotations(
+    models=("Model directories to compare", "positional", None, str),
+    scale=("Repeat the corpus this many times", "option", "s", int),
+    batch_size=("Number of documents per batch", "option", "b", int),
+    output_path=("Also write the results to this JSON file", "option", "o", Path))
+
+def main(scale=10, batch_size=64, output_path=None, *models):
+    texts = [article.text for path in ('Training.txt', 'Test.txt')
+             for article in Corpus(path)] * scale
+    examples = evaluation_examples()
+    results = OrderedDict()
+    for model in models:
+        results[model] = bench_model(model, texts, examples,
+                                     batch_size=batch_size)
+    keys = list(results[models[0]]) if models else []
+    print("%-20s" % "" + "".join("%14s" % model[-14:] for model in models))
+    for key in keys:
+        print("%-20s" % key + "".join("%14.2f" % results[model][key]
+                                      for model in models))
+    if output_path is not None:
+        with io.open(str(output_path), 'w', encoding='utf8') as file_:
+            file_.write(json.dumps(results, indent=2))
+        print("Wrote results to", output_path)
+
+
+if __name__ == '__main__':
+    plac.call(main)
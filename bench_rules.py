@@ -0,0 +1,91 @@
+"""Benchmark the rule-based pre-pass against the NER-only pipeline
+
+Runs Training.txt and Test.txt (repeated `scale` times) through four
+setups and prints their docs/sec next to the F1 they reach on the gold
+spans of TRAIN_DATA and EVALUATION_DATA:
+
+    ner         the saved model as it is
+    rules+ner   rules.py components around the NER, all labels
+    rules-skip  only BATTLE and DATE; articles the rules cover skip the NER
+    rules-only  the patterns alone, no model
+
+    python bench_rules.py -m Aici -s 10
+"""
+from __future__ import unicode_literals, print_function
+
+import plac
+import time
+
+import spacy
+
+from corpus import Corpus
+from evaluation import Scorer, doc_spans
+from historical_battle import TRAIN_DATA, evaluation_examples
+from rules import RULE_LABELS, add_rules, find_spans, rule_pipe
+
+
+def gold_examples():
+    examples = [(text, annotations['entities'])
+                for text, annotations in TRAIN_DATA]
+    return examples + evaluation_examples()
+
+
+def run(process, texts, examples, labels=None):
+    """Time `process` (a function from a list of texts to a list of span
+    lists) on `texts` and score it on `examples`."""
+    start = time.time()
+    process(texts)
+    elapsed = time.time() - start
+    scorer = Scorer()
+    predictions = process([text for text, _ in examples])
+    for (text, gold), pred in zip(examples, predictions):
+        if labels:
+            gold = [span for span in gold if span[2] in labels]
+        scorer.score(gold, pred)
+    scores = scorer.scores()
+    f1 = dict((label, scores[label]['exact']['f'] * 100 if label in scores
+               else 0.0) for label in RULE_LABELS + ('ALL',))
+    return len(texts) / elapsed if elapsed else 0.0, f1
+
+
+@plac.annotations(
+    model=("Model directory", "option", "m", str),
+    scale=("Repeat the corpus this many times", "option", "s", int),
+    batch_size=("Number of documents per batch", "option", "b", int))
+
+def main(model='Aici', scale=10, batch_size=64):
+    texts = [article.text for path in ('Training.txt', 'Test.txt')
+             for article in Corpus(path)] * scale
+    examples = gold_examples()
+    nlp = spacy.load(model)
+    rules_nlp = add_rules(spacy.load(model))
+
+    def ner(texts):
+        return [doc_spans(doc) for doc in nlp.pipe(texts, batch_size=batch_size)]
+
+    def rules_ner(texts):
+        return [doc_spans(doc) for doc in rule_pipe(rules_nlp, texts,
+                                                    batch_size=batch_size)]
+
+    def rules_skip(texts):
+        return [doc_spans(doc) for doc in rule_pipe(
+            rules_nlp, texts, batch_size=batch_size, labels=RULE_LABELS)]
+
+    def rules_only(texts):
+        return [find_spans(text) for text in texts]
+
+    print("%d articles, %d gold documents" % (len(texts), len(examples)))
+    print("%-12s %10s %8s %8s %8s" % ("setup", "docs/sec", "BATTLE", "DATE",
+                                      "ALL"))
+    for name, process, labels in [('ner', ner, None),
+                                  ('rules+ner', rules_ner, None),
+                                  ('rules-skip', rules_skip, RULE_LABELS),
+                                  ('rules-only', rules_only, RULE_LABELS)]:
+        docs_per_sec, f1 = run(process, texts, examples, labels=labels)
+        print("%-12s %10.1f %8.2f %8.2f %8.2f" % (
+            name, docs_per_sec, f1['BATTLE'], f1['DATE'], f1['ALL']))
+    print("(F1 in %; ALL is over BATTLE and DATE only for the last two)")
+
+
+if __name__ == '__main__':
+    plac.call(main)
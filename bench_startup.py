@@ -0,0 +1,96 @@
+"""Measure the cold start of the extraction path
+
+Every step runs in a fresh Python process, so nothing is cached in the
+interpreter:
+
+    import extract      importing the extraction module (no spaCy yet)
+    import spacy        what every script used to pay up front
+    spacy.load          loading the model directory
+    snapshot            loading <model>.snapshot (written first if missing)
+    first record        `python extract.py` on one article, from its
+                        imports to the first record written
+
+and the wall time of the whole extract.py run, interpreter start-up
+included. Times over --target seconds are flagged.
+
+    python bench_startup.py -m Aici -r 5
+"""
+from __future__ import unicode_literals, print_function
+
+import io
+import json
+import os
+import plac
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from corpus import Corpus
+from snapshot import snapshot_path, write_snapshot
+
+TIMED = '''
+import time
+start = time.time()
+%s
+print(time.time() - start)
+'''
+
+
+def timed(code):
+    """Seconds `code` takes in a new interpreter."""
+    output = subprocess.check_output([sys.executable, '-c', TIMED % code])
+    return float(output.decode('utf8').split()[-1])
+
+
+def time_extract(model, input_path, output_path):
+    """(seconds to the first record, wall time) of one extract.py run."""
+    start = time.time()
+    output = subprocess.check_output([sys.executable, 'extract.py',
+                                      input_path, output_path, '-m', model])
+    wall = time.time() - start
+    match = re.search(r'First record ([\d.]+)s', output.decode('utf8'))
+    return (float(match.group(1)) if match else wall), wall
+
+
+@plac.annotations(
+    model=("Model directory", "option", "m", str),
+    repeat=("Runs per measurement (the best is reported)", "option", "r", int),
+    target=("Start-up target in seconds", "option", "t", float))
+
+def main(model='Aici', repeat=5, target=0.3):
+    if not os.path.exists(snapshot_path(model)):
+        print("Writing", write_snapshot(model))
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        input_path = os.path.join(tmp_dir, 'article.jsonl')
+        output_path = os.path.join(tmp_dir, 'out.jsonl')
+        with io.open(input_path, 'w', encoding='utf8') as file_:
+            file_.write(json.dumps({'id': 0, 'text': Corpus('Test.txt')[0]})
+                        + '\n')
+        steps = [
+            ('import extract', lambda: timed('import extract')),
+            ('import spacy', lambda: timed('import spacy')),
+            ('spacy.load', lambda: timed('import spacy; spacy.load(%r)' %
+                                         model)),
+            ('snapshot', lambda: timed('import snapshot; '
+                                       'snapshot.read_snapshot(%r)' %
+                                       snapshot_path(model))),
+        ]
+        results = [(name, min(step() for _ in range(repeat)))
+                   for name, step in steps]
+        runs = [time_extract(model, input_path, output_path)
+                for _ in range(repeat)]
+        results.append(('first record', min(first for first, _ in runs)))
+        results.append(('extract.py wall', min(wall for _, wall in runs)))
+    finally:
+        shutil.rmtree(tmp_dir)
+    for name, seconds in results:
+        print("%-16s %8.3fs%s" % (name, seconds,
+                                  '  over target' if seconds > target else ''))
+
+
+if __name__ == '__main__':
+    plac.call(main)
@@ -0,0 +1,126 @@
+"""Throughput benchmark suite for training and extraction
+
+Replays Training.txt and Test.txt repeated at several scales and measures,
+with profiling.Profiler:
+
+* training: one iteration over TRAIN_DATA * scale on a blank model
+  (words/sec and per-example update latency)
+* extraction: the Aici model over all articles * scale (model load time,
+  and docs/sec and words/sec for tokenization and for the NER)
+
+The results are written to a JSON report. Passing the report of an earlier
+run as --baseline compares the throughput numbers and exits with status 1
+when any of them dropped by more than --tolerance.
+
+    python bench_suite.py bench.json -s 1,10,100
+    python bench_suite.py bench_new.json -s 1,10,100 -b bench.json
+"""
+from __future__ import unicode_literals, print_function
+
+import io
+import json
+import plac
+import random
+import sys
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import spacy
+
+from corpus import Corpus
+from historical_battle import TRAIN_DATA, create_model, train
+from profiling import Profiler, peak_rss, profiled_pipe
+
+
+def bench_training(scale):
+    random.seed(0)
+    profiler = Profiler()
+    nlp, optimizer = create_model()
+    train(nlp, optimizer, list(TRAIN_DATA) * scale, n_iter=1, verbose=False,
+          profiler=profiler)
+    summary = profiler.summary()
+    update = summary['update']
+    return OrderedDict([
+        ('words_per_sec', summary['iteration']['words_per_sec']),
+        ('examples_per_sec', summary['iteration']['examples_per_sec']),
+        ('update_ms_per_example', update['seconds'] / update['examples'] * 1000),
+    ])
+
+
+def bench_extraction(model, scale, batch_size):
+    profiler = Profiler()
+    with profiler.timer('load_model'):
+        nlp = spacy.load(model)
+    texts = [article.text for path in ('Training.txt', 'Test.txt')
+             for article in Corpus(path)] * scale
+    start = time.time()
+    profiled_pipe(nlp, texts, profiler, batch_size=batch_size)
+    elapsed = time.time() - start
+    summary = profiler.summary()
+    result = OrderedDict([
+        ('load_model_sec', summary['load_model']['seconds']),
+        ('docs_per_sec', len(texts) / elapsed if elapsed else 0.0),
+    ])
+    for name in ['tokenize'] + nlp.pipe_names:
+        result['%s_words_per_sec' % name] = summary[name]['words_per_sec']
+        result['%s_share' % name] = (summary[name]['seconds'] / elapsed
+                                     if elapsed else 0.0)
+    return result
+
+
+def compare(report, baseline, tolerance):
+    """Return messages for every throughput number that dropped by more than
+    `tolerance` (a fraction) against the baseline."""
+    regressions = []
+    for scale, sections in report['scales'].items():
+        for section, results in sections.items():
+            old = baseline.get('scales', {}).get(scale, {}).get(section, {})
+            for key, value in results.items():
+                if not key.endswith('_per_sec') or key not in old:
+                    continue
+                if old[key] and value < old[key] * (1.0 - tolerance):
+                    regressions.append("scale %s %s %s: %.1f -> %.1f (%.0f%%)" % (
+                        scale, section, key, old[key], value,
+                        (value / old[key] - 1.0) * 100))
+    return regressions
+
+
+@plac.annotations(
+    output_path=("Where to write the JSON report", "positional", None, Path),
+    scales=("Comma-separated corpus repeat factors", "option", "s", str),
+    model=("Model directory for the extraction benchmark", "option", "m", str),
+    batch_size=("Number of documents per batch", "option", "bs", int),
+    baseline_path=("Report of an earlier run to compare against", "option", "b", Path),
+    tolerance=("Allowed throughput drop against the baseline", "option", "t", float))
+
+def main(output_path, scales='1,10,100', model='Aici', batch_size=64,
+         baseline_path=None, tolerance=0.1):
+    report = OrderedDict([('scales', OrderedDict())])
+    for scale in [int(s) for s in scales.split(',') if s.strip()]:
+        print("Scale x%d" % scale)
+        results = OrderedDict()
+        results['training'] = bench_training(scale)
+        results['extraction'] = bench_extraction(model, scale, batch_size)
+        for section, numbers in results.items():
+            for key, value in numbers.items():
+                print("  %-10s %-28s %12.2f" % (section, key, value))
+        report['scales'][str(scale)] = results
+    report['peak_rss_mb'] = peak_rss()
+    with io.open(str(output_path), 'w', encoding='utf8') as file_:
+        file_.write(json.dumps(report, indent=2))
+    print("Wrote report to", output_path)
+
+    if baseline_path is not None:
+        with io.open(str(baseline_path), encoding='utf8') as file_:
+            baseline = json.load(file_)
+        regressions = compare(report, baseline, tolerance)
+        for message in regressions:
+            print("REGRESSION", message)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", baseline_path)
+
+
+if __name__ == '__main__':
+    plac.call(main)
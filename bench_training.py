@@ -0,0 +1,58 @@
+"""Benchmark the batched training loop against the one-by-one loop
+
+Trains a fresh blank 'en' entity recognizer on TRAIN_DATA (built from
+Training.txt in historical_battle.py) twice: once with one example per
+update, the way the scripts used to train, and once with compounding
+minibatches. Prints the words/sec of both runs and the speedup.
+
+    python bench_training.py -n 10
+"""
+from __future__ import unicode_literals, print_function
+
+import plac
+import random
+import time
+
+from historical_battle import TRAIN_DATA, create_model, train
+
+
+def run(train_data, n_iter, batch_start, batch_stop, batch_compound):
+    random.seed(0)
+    nlp, optimizer = create_model()
+    start = time.time()
+    history = train(nlp, optimizer, train_data, n_iter=n_iter, drop=0.35,
+                    batch_start=batch_start, batch_stop=batch_stop,
+                    batch_compound=batch_compound)
+    elapsed = time.time() - start
+    wps = sum(h['words_per_sec'] for h in history) / len(history)
+    return elapsed, wps
+
+
+@plac.annotations(
+    n_iter=("Number of training iterations per run", "option", "n", int),
+    repeat=("Repeat TRAIN_DATA this many times per iteration", "option", "r", int),
+    batch_start=("Initial minibatch size", "option", "bs", float),
+    batch_stop=("Maximum minibatch size", "option", "be", float),
+    batch_compound=("Minibatch size growth rate", "option", "bc", float))
+
+def main(n_iter=10, repeat=1, batch_start=4.0, batch_stop=32.0,
+         batch_compound=1.001):
+    train_data = list(TRAIN_DATA) * repeat
+    print("Training on %d examples, %d iterations" % (len(train_data), n_iter))
+
+    print("\nOne example per update:")
+    single_time, single_wps = run(train_data, n_iter, 1, 1, 1.0)
+    print("\nMinibatches of %g to %g:" % (batch_start, batch_stop))
+    batch_time, batch_wps = run(train_data, n_iter, batch_start, batch_stop,
+                                batch_compound)
+
+    print("")
+    print("%-12s %10s %12s" % ("mode", "seconds", "words/sec"))
+    print("%-12s %10.2f %12.0f" % ("one-by-one", single_time, single_wps))
+    print("%-12s %10.2f %12.0f" % ("batched", batch_time, batch_wps))
+    if batch_time:
+        print("Speedup: %.2fx" % (single_time / batch_time))
+
+
+if __name__ == '__main__':
+    plac.call(main)
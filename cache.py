@@ -0,0 +1,143 @@
+"""On-disk cache of extraction results
+
+Results are stored in a SQLite file, keyed by the SHA-1 of the article text
+and an identity of the model: a hash of Aici/meta.json and of the name, size
+and modification time of every file in the model directory. Retraining or
+replacing the model changes its identity, and the entries of any other model
+are dropped when the cache is opened.
+
+The cache is bounded by size: every hit refreshes the entry's access time
+and the least recently used entries are evicted once the stored results
+exceed `max_bytes`.
+
+    cache = ExtractionCache('extract.cache', 'Aici')
+    record = cache.get(text)
+    if record is None:
+        record = ...
+        cache.put(text, record)
+    print(cache.hit_rate)
+"""
+from __future__ import unicode_literals, print_function
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def text_key(text):
+    return hashlib.sha1(text.encode('utf8')).hexdigest()
+
+
+def model_identity(model_dir, variant=''):
+    """Hash of everything that makes up a model directory, and of
+    `variant`, which names any options that change the results."""
+    digest = hashlib.sha1()
+    digest.update(variant.encode('utf8'))
+    if not os.path.isdir(str(model_dir)):
+        digest.update(str(model_dir).encode('utf8'))
+        return digest.hexdigest()
+    meta_path = os.path.join(str(model_dir), 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path, 'rb') as file_:
+            digest.update(file_.read())
+    for root, dirs, files in os.walk(str(model_dir)):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            relpath = os.path.relpath(path, str(model_dir))
+            digest.update(('%s %d %d\n' % (relpath, stat.st_size,
+                                           int(stat.st_mtime))).encode('utf8'))
+    return digest.hexdigest()
+
+
+class ExtractionCache(object):
+    """Size-bounded LRU cache of extraction records for one model."""
+
+    def __init__(self, path, model_dir, max_bytes=1024 ** 3, variant=''):
+        self.path = str(path)
+        self.model_id = model_identity(model_dir, variant)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        # callers may share one cache between threads
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS results ('
+                        'key TEXT PRIMARY KEY, model TEXT, value TEXT, '
+                        'size INTEGER, atime REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS results_atime '
+                        'ON results (atime)')
+        # results of any other model are stale
+        self.db.execute('DELETE FROM results WHERE model != ?',
+                        (self.model_id,))
+        self.db.commit()
+        self.size = self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def get(self, text, key=None):
+        key = key or text_key(text)
+        with self.lock:
+            row = self.db.execute('SELECT value FROM results WHERE key = ?',
+                                  (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute('UPDATE results SET atime = ? WHERE key = ?',
+                            (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, text, record, key=None):
+        key = key or text_key(text)
+        value = json.dumps(record)
+        with self.lock:
+            old = self.db.execute('SELECT size FROM results WHERE key = ?',
+                                  (key,)).fetchone()
+            if old is not None:
+                self.size -= old[0]
+            self.db.execute('INSERT OR REPLACE INTO results '
+                            'VALUES (?, ?, ?, ?, ?)',
+                            (key, self.model_id, value, len(value),
+                             time.time()))
+            self.size += len(value)
+            if self.size > self.max_bytes:
+                self._evict()
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                self.db.commit()
+
+    def _evict(self):
+        # drop the least recently used tenth in one go, not one row per put
+        target = self.max_bytes * 0.9
+        rows = self.db.execute('SELECT key, size FROM results '
+                               'ORDER BY atime')
+        doomed = []
+        for key, size in rows:
+            if self.size <= target:
+                break
+            doomed.append((key,))
+            self.size -= size
+        self.db.executemany('DELETE FROM results WHERE key = ?', doomed)
+        self.evictions += len(doomed)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+    def report(self):
+        return ("cache: %d hits, %d misses (%.1f%% hit rate), %d evicted, "
+                "%.1f MB stored" % (self.hits, self.misses,
+                                    self.hit_rate * 100, self.evictions,
+                                    self.size / (1024.0 * 1024.0)))
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
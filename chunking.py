@@ -0,0 +1,96 @@
+"""Split very long articles into overlapping windows and merge the results
+
+Passing a whole war history to `nlp(...)` costs memory in proportion to its
+length and fails once it passes `nlp.max_length`. Instead, the text is cut
+into windows of at most `max_chars` characters that end on sentence
+boundaries, with neighbouring windows sharing `overlap` sentences. Each
+window can go through the pipeline (and to a different worker) on its own;
+merge_windows() then puts the entities back together in document offsets.
+
+An entity seen in two windows is kept once. When windows disagree, the
+entity found furthest from a window edge wins, since one that touches a cut
+may be truncated.
+"""
+from __future__ import unicode_literals, print_function
+
+import re
+from bisect import bisect_left
+
+# end of a sentence: punctuation, optional closing quotes/brackets, space
+SENTENCE_END = re.compile(r'([.!?]["\')\]]*)\s+|\n+')
+
+
+def sentence_spans(text):
+    """(start, end) character offsets of the sentences in `text`."""
+    spans = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        end = match.end(1) if match.group(1) else match.start()
+        if end > start:
+            spans.append((start, end))
+        start = match.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+    return spans
+
+
+def make_windows(text, max_chars=20000, overlap=1):
+    """Sentence-aligned (start, end) windows of at most `max_chars`
+    characters, each sharing `overlap` sentences with the previous one.
+    Sentences longer than `max_chars` are cut at the last space that fits."""
+    if len(text) <= max_chars:
+        return [(0, len(text))]
+    pieces = []
+    for start, end in sentence_spans(text):
+        while end - start > max_chars:
+            cut = text.rfind(' ', start + 1, start + max_chars)
+            if cut <= start:
+                cut = start + max_chars
+            pieces.append((start, cut))
+            start = cut
+        pieces.append((start, end))
+    windows = []
+    i = 0
+    while i < len(pieces):
+        j = i + 1
+        while j < len(pieces) and pieces[j][1] - pieces[i][0] <= max_chars:
+            j += 1
+        windows.append((pieces[i][0], pieces[j - 1][1]))
+        if j >= len(pieces):
+            break
+        i = max(i + 1, j - overlap)
+    return windows
+
+
+def merge_windows(windows):
+    """Merge the entities found in the windows of one document.
+
+    `windows` is a list of (window_start, window_end, entities), where every
+    entity is a tuple starting with (start, end, label) in document offsets.
+    Returns the non-overlapping entities sorted by offset.
+    """
+    doc_end = max(end for _, end, _ in windows)
+    unbounded = float('inf')
+    candidates = []
+    for window_start, window_end, entities in windows:
+        for entity in entities:
+            start, end = entity[0], entity[1]
+            left = start - window_start if window_start > 0 else unbounded
+            right = window_end - end if window_end < doc_end else unbounded
+            candidates.append((min(left, right), entity))
+    # furthest from a cut first, then longest
+    candidates.sort(key=lambda c: (-c[0], c[1][0] - c[1][1]))
+    starts = []
+    ends = []
+    merged = []
+    for margin, entity in candidates:
+        start, end = entity[0], entity[1]
+        i = bisect_left(starts, start)
+        if i and ends[i - 1] > start:
+            continue
+        if i < len(starts) and starts[i] < end:
+            continue
+        starts.insert(i, start)
+        ends.insert(i, end)
+        merged.insert(i, entity)
+    return merged
@@ -0,0 +1,178 @@
+"""Streaming reader for the article dumps (Training.txt, Test.txt)
+
+Articles are separated by lines containing only `---`. Instead of reading
+the whole file and splitting it, the reader walks the file line by line and
+keeps a single article in memory at a time. The text of every article is
+returned exactly as it is in the file (minus the newline before the
+separator), so character offsets inside an article don't move when it spans
+several lines.
+
+    for article in Corpus('Training.txt'):
+        print(article.index, article.start, article.text[:40])
+
+    train_text = Corpus('Training.txt')
+    print(len(train_text), train_text[3])
+
+Examples pairs articles with annotations without reading the file until the
+examples are used, so modules can define their training data cheaply.
+
+Random access goes through an index of the byte offsets where every article
+starts and ends, and a memory map of the file, so only the requested article
+is decoded.
+"""
+from __future__ import unicode_literals, print_function
+
+import mmap
+import os
+from array import array
+from collections import namedtuple
+
+SEPARATOR = b'---'
+
+Article = namedtuple('Article', ['index', 'start', 'end', 'text'])
+
+
+def iter_spans(file_):
+    """Yield the (start, end) byte offsets of the articles in a binary file."""
+    start = offset = 0
+    last_end = None
+    for line in file_:
+        if line.strip() == SEPARATOR:
+            yield start, last_end if last_end is not None else start
+            start = offset + len(line)
+            last_end = None
+        elif line.rstrip(b'\r\n'):
+            last_end = offset + len(line.rstrip(b'\r\n'))
+        offset += len(line)
+    if last_end is not None:
+        yield start, last_end
+
+
+def from_stripped_offsets(text, entities):
+    """Translate (start, end, label) offsets that were counted on `text` with
+    its newlines removed into offsets into `text` itself."""
+    positions = [i for i, char in enumerate(text) if char not in '\r\n']
+    return [(positions[start], positions[end - 1] + 1, label)
+            for start, end, label in entities]
+
+
+class Corpus(object):
+    """An article dump on disk. Iterating streams the articles, indexing and
+    len() use a byte offset index that is built on first use."""
+
+    def __init__(self, path, encoding='utf8', index_path=None):
+        self.path = str(path)
+        self.encoding = encoding
+        self.index_path = str(index_path) if index_path else None
+        self._index = None
+        self._file = None
+        self._mmap = None
+
+    def __iter__(self):
+        with open(self.path, 'rb') as file_:
+            lines = []
+            start = offset = 0
+            i = 0
+            for line in file_:
+                if line.strip() == SEPARATOR:
+                    yield self._article(i, start, lines)
+                    i += 1
+                    start = offset + len(line)
+                    lines = []
+                else:
+                    lines.append(line)
+                offset += len(line)
+            if any(line.rstrip(b'\r\n') for line in lines):
+                yield self._article(i, start, lines)
+
+    def _article(self, i, start, lines):
+        data = b''.join(lines).rstrip(b'\r\n')
+        return Article(i, start, start + len(data), data.decode(self.encoding))
+
+    @property
+    def index(self):
+        """Flat array of start, end byte offsets, two entries per article."""
+        if self._index is None:
+            self._index = self._load_index()
+        return self._index
+
+    def _load_index(self):
+        index = array('Q')
+        if self.index_path and os.path.exists(self.index_path) and \
+                os.path.getmtime(self.index_path) >= os.path.getmtime(self.path):
+            with open(self.index_path, 'rb') as file_:
+                index.frombytes(file_.read())
+            return index
+        with open(self.path, 'rb') as file_:
+            for start, end in iter_spans(file_):
+                index.append(start)
+                index.append(end)
+        if self.index_path:
+            with open(self.index_path, 'wb') as file_:
+                index.tofile(file_)
+        return index
+
+    def __len__(self):
+        return len(self.index) // 2
+
+    def __getitem__(self, i):
+        return self.article(i).text
+
+    def article(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("article index out of range: %d" % i)
+        start, end = self.index[2 * i], self.index[2 * i + 1]
+        if end == start:
+            return Article(i, start, end, '')
+        if self._mmap is None:
+            self._file = open(self.path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        text = self._mmap[start:end].decode(self.encoding)
+        return Article(i, start, end, text)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+
+
+class Examples(object):
+    """Training examples for articles of a dump, from (article index,
+    {'entities': spans}) pairs with offsets counted on the articles with their
+    newlines removed. Behaves like a list of (text, annotations) tuples; the
+    dump is read the first time an example is needed."""
+
+    def __init__(self, path, annotations):
+        self.path = str(path)
+        self.annotations = annotations
+        self._examples = None
+
+    @property
+    def examples(self):
+        if self._examples is None:
+            corpus = Corpus(self.path)
+            try:
+                examples = []
+                for i, annotations in self.annotations:
+                    text = corpus[i]
+                    entities = from_stripped_offsets(text,
+                                                     annotations['entities'])
+                    examples.append((text, {'entities': entities}))
+            finally:
+                corpus.close()
+            self._examples = examples
+        return self._examples
+
+    def __iter__(self):
+        return iter(self.examples)
+
+    def __len__(self):
+        return len(self.examples)
+
+    def __getitem__(self, i):
+        return self.examples[i]
@@ -0,0 +1,226 @@
+"""Cross-document deduplication of leaders and belligerents
+
+Clusters the LEADER and BELLIGERENT1/2 mentions of a whole extract.py output
+so that "John III Sobieski" and "King of Poland John III Sobieski", or
+"French army" and "the French Army", get the same canonical id.
+
+Every distinct mention is first reduced to a set of key words:
+
+* leaders lose their titles ("King", "Grand Vizier", "General", ...) and a
+  trailing "of <nation>"
+* belligerents are mapped to nations with the gazetteer built from
+  nationalities.csv ("French army" -> France), falling back to their words
+  minus generic ones ("army", "forces", ...)
+
+Mentions with the same key are merged. Otherwise mentions are only
+compared with mentions that share a key word (blocking), and words that
+occur in more than `max_block` mentions don't form blocks, so the work grows
+about linearly with the number of mentions. Then:
+
+* two keys of several words merge when they share at least two words and
+  one is (almost) contained in the other
+* keys made of nations merge only when their nation sets are (nearly) the
+  same, so "German forces" doesn't join "Polish-Austrian-German forces"
+* a one-word key ("Napoleon") joins a cluster only if it is the single
+  cluster containing that word; otherwise it stays on its own
+
+    python dedupe.py entities.jsonl entities.clusters.json -r entities.ids.jsonl
+"""
+from __future__ import unicode_literals, print_function
+
+import io
+import json
+import plac
+import re
+from collections import Counter, OrderedDict, defaultdict
+from pathlib import Path
+
+from gazetteer import NATION, NATIONALITY, load_gazetteer
+from store import read_records
+
+WORD = re.compile(r"[\w']+", re.UNICODE)
+
+TITLES = set('''king queen emperor empress tsar czar sultan shah khan pharaoh
+prince princess duke archduke count comte lord sir grand vizier pasha general
+lieutenant colonel major captain admiral marshal field commander chief
+voivod voivode the of and'''.split())
+GENERIC = set('''the army armies force forces troops troop military host
+coalition allied allies alliance and of its their''' .split())
+
+LEADER_FIELDS = ['leaders']
+BELLIGERENT_FIELDS = ['first_army', 'second_army']
+
+
+class UnionFind(object):
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        i, j = self.find(i), self.find(j)
+        if i != j:
+            self.parent[max(i, j)] = min(i, j)
+
+
+def leader_key(text, gazetteer):
+    words = [word.lower() for word in WORD.findall(text)]
+    # "King of Poland John III Sobieski", "Tsar Alexander I of Russia"
+    kept = []
+    i = 0
+    while i < len(words):
+        if words[i] == 'of' and i + 1 < len(words):
+            entry = gazetteer.lookup(words[i + 1])
+            if entry is not None and entry[0] in (NATION, NATIONALITY):
+                i += 2
+                continue
+        kept.append(words[i])
+        i += 1
+    key = set(word for word in kept if word not in TITLES)
+    return frozenset(key or words)
+
+
+def belligerent_key(text, gazetteer):
+    words = [word.lower() for word in WORD.findall(text)]
+    nations = set(value.lower() for start, end, kind, value
+                  in gazetteer.match_tokens(words)
+                  if kind in (NATION, NATIONALITY))
+    if nations:
+        return frozenset('nation:%s' % nation for nation in nations)
+    key = set(word for word in words if word not in GENERIC)
+    return frozenset(key or words)
+
+
+def is_nation_key(key):
+    return all(word.startswith('nation:') for word in key)
+
+
+def similar(a, b, threshold):
+    """Whether two keys of several words (or of nations) name the same
+    thing."""
+    overlap = len(a & b)
+    if is_nation_key(a) or is_nation_key(b):
+        # a coalition only matches the same (or nearly the same) nations
+        return overlap >= threshold * len(a | b)
+    return overlap >= 2 and overlap >= threshold * min(len(a), len(b))
+
+
+def is_short(key):
+    return len(key) == 1 and not is_nation_key(key)
+
+
+def cluster(mentions, key_func, prefix, threshold=0.8, max_block=1000):
+    """Cluster mention counts ({surface form: count}). Returns a list of
+    clusters, largest first, each a dict with an id, a canonical name and
+    the mentions in it."""
+    gazetteer = load_gazetteer()
+    forms_by_key = defaultdict(list)
+    for form in sorted(mentions):
+        forms_by_key[key_func(form, gazetteer)].append(form)
+    keys = sorted(forms_by_key, key=sorted)
+    union = UnionFind(len(keys))
+
+    blocks = defaultdict(list)
+    for i, key in enumerate(keys):
+        if not is_short(key):
+            for word in key:
+                blocks[word].append(i)
+    for i, key in enumerate(keys):
+        if is_short(key):
+            continue
+        candidates = set()
+        for word in key:
+            block = blocks[word]
+            if len(block) <= max_block:
+                candidates.update(j for j in block if j < i)
+        for j in candidates:
+            if union.find(i) != union.find(j) and \
+                    similar(key, keys[j], threshold):
+                union.union(i, j)
+    # short keys last, so they see the finished clusters; an ambiguous one
+    # ("Napoleon" with both "Louis Napoleon" and "Napoleon Bonaparte")
+    # stays on its own
+    for i, key in enumerate(keys):
+        if not is_short(key):
+            continue
+        block = blocks.get(next(iter(key)), [])
+        if len(block) <= max_block:
+            roots = set(union.find(j) for j in block)
+            if len(roots) == 1:
+                union.union(i, roots.pop())
+
+    members = defaultdict(list)
+    for i, key in enumerate(keys):
+        members[union.find(i)].extend(forms_by_key[key])
+    groups = sorted(members.values(),
+                    key=lambda forms: (-sum(mentions[f] for f in forms),
+                                       min(forms)))
+    clusters = []
+    for n, group in enumerate(groups, 1):
+        # most frequent surface form, longest on ties
+        name = max(group, key=lambda form: (mentions[form], len(form)))
+        clusters.append(OrderedDict([
+            ('id', '%s%d' % (prefix, n)),
+            ('name', name),
+            ('count', sum(mentions[form] for form in group)),
+            ('mentions', sorted(group, key=lambda form: -mentions[form])),
+        ]))
+    return clusters
+
+
+def count_mentions(records, fields):
+    counts = Counter()
+    for record in records:
+        for field in fields:
+            counts.update(record.get(field, []))
+    return counts
+
+
+@plac.annotations(
+    input_path=("extract.py JSONL output", "positional", None, Path),
+    output_path=("Where to write the clusters (JSON)", "positional", None, Path),
+    records_path=("Also write the records with canonical ids added (JSONL)", "option", "r", Path),
+    threshold=("Fraction of the shorter key (of all nations, for coalitions) that has to match", "option", "t", float),
+    max_block=("Ignore words shared by more mentions than this", "option", "mb", int))
+
+def main(input_path, output_path, records_path=None, threshold=0.8,
+         max_block=1000):
+    leaders = cluster(count_mentions(read_records(input_path), LEADER_FIELDS),
+                      leader_key, 'L', threshold=threshold, max_block=max_block)
+    belligerents = cluster(
+        count_mentions(read_records(input_path), BELLIGERENT_FIELDS),
+        belligerent_key, 'B', threshold=threshold, max_block=max_block)
+    with io.open(str(output_path), 'w', encoding='utf8') as file_:
+        file_.write(json.dumps(OrderedDict([('leaders', leaders),
+                                            ('belligerents', belligerents)]),
+                               indent=2))
+    print("%d leader mentions -> %d leaders" % (
+        sum(len(c['mentions']) for c in leaders), len(leaders)))
+    print("%d belligerent mentions -> %d belligerents" % (
+        sum(len(c['mentions']) for c in belligerents), len(belligerents)))
+
+    if records_path is not None:
+        ids = {}
+        for prefix, clusters in (('leaders', leaders),
+                                 ('belligerents', belligerents)):
+            ids[prefix] = dict((form, c['id']) for c in clusters
+                               for form in c['mentions'])
+        with io.open(str(records_path), 'w', encoding='utf8') as file_:
+            for record in read_records(input_path):
+                record['leader_ids'] = sorted(set(
+                    ids['leaders'][form] for form in record.get('leaders', [])))
+                for field in BELLIGERENT_FIELDS:
+                    record[field + '_ids'] = sorted(set(
+                        ids['belligerents'][form]
+                        for form in record.get(field, [])))
+                file_.write(json.dumps(record) + '\n')
+        print("Wrote records with canonical ids to", records_path)
+
+
+if __name__ == '__main__':
+    plac.call(main)
@@ -0,0 +1,85 @@
+"""Distil the saved model into a smaller, faster one
+
+The teacher (Aici/ by default) labels a collection of unlabelled articles,
+and a blank model with the 'fast' NER profile of historical_battle.py
+(narrower token vectors and hidden layer, fewer maxout pieces, a smaller
+embedding table) is trained on those predictions together with TRAIN_DATA.
+spaCy v2 doesn't expose the teacher's action scores, so the student learns
+from its entity spans rather than from soft targets. During training the
+student is scored on a dev split (the last --n-dev articles of TRAIN_DATA, or
+--dev-path) and its best weights are saved; Test.txt is only used for the
+final teacher and student scores.
+
+    python distill.py articles/ Aici-fast -t Aici -n 30 -ee 2 -pt 3
+    python bench_profiles.py Aici Aici-fast
+
+The articles are read like extract.py reads them: a directory of .txt
+dumps or a JSONL file with a "text" field per line.
+"""
+from __future__ import unicode_literals, print_function
+
+import plac
+import random
+from pathlib import Path
+
+import spacy
+
+from evaluation import doc_spans
+from extract import read_articles
+from historical_battle import (PROFILES, TRAIN_DATA, create_model, evaluate,
+                               evaluation_examples, save_model, split_dev,
+                               train)
+
+
+def silver_examples(teacher, texts, batch_size=64):
+    """(text, {'entities': spans}) training examples from the teacher's
+    predictions."""
+    return [(doc.text, {'entities': doc_spans(doc)})
+            for doc in teacher.pipe(texts, batch_size=batch_size)]
+
+
+@plac.annotations(
+    input_path=("Unlabelled articles: directory of .txt dumps or JSONL", "positional", None, Path),
+    output_dir=("Where to save the student model", "positional", None, Path),
+    teacher=("Teacher model directory", "option", "t", str),
+    profile=("NER size profile of the student", "option", "pr", str, sorted(PROFILES)),
+    n_iter=("Number of training iterations", "option", "n", int),
+    drop=("Dropout rate", "option", "d", float),
+    eval_every=("Evaluate every N iterations (0 = only at the end)", "option", "ee", int),
+    patience=("Stop after N evaluations without improvement (0 = never)", "option", "pt", int),
+    dev_path=("Gold JSONL to evaluate on during training (default: hold out TRAIN_DATA)", "option", "dv", Path),
+    n_dev=("Training articles held out for evaluation during training", "option", "nd", int),
+    batch_size=("Number of articles per batch when labelling", "option", "b", int))
+
+def main(input_path, output_dir, teacher='Aici', profile='fast', n_iter=30,
+         drop=0.2, eval_every=2, patience=3, dev_path=None, n_dev=2,
+         batch_size=64):
+    random.seed(0)
+    # keep the gold articles (and Test.txt) out of the silver data
+    gold_texts = set(text for text, _ in TRAIN_DATA)
+    gold_texts.update(text for text, _ in evaluation_examples())
+    texts = [text for id_, text in read_articles(input_path)
+             if text not in gold_texts]
+    print("Labelling %d articles with %s" % (len(texts), teacher))
+    teacher_nlp = spacy.load(teacher)
+    silver = silver_examples(teacher_nlp, texts, batch_size=batch_size)
+    print("Teacher F1 on Test.txt: %.2f" % evaluate(teacher_nlp,
+                                                     verbose=False))
+    del teacher_nlp
+
+    nlp, optimizer = create_model(profile=profile)
+    nlp.meta['ner_profile'] = profile
+
+    def checkpoint(nlp):
+        save_model(nlp, output_dir, '%s-%s' % (teacher, profile))
+
+    train_data, dev = split_dev(TRAIN_DATA, dev_path, n_dev)
+    train(nlp, optimizer, silver + train_data, n_iter=n_iter, drop=drop,
+          eval_every=eval_every, patience=patience, eval_examples=dev,
+          checkpoint=checkpoint)
+    print("Student F1 on Test.txt: %.2f" % evaluate(nlp, verbose=False))
+    checkpoint(nlp)
+
+
+if __name__ == '__main__':
+    plac.call(main)
@@ -0,0 +1,203 @@
+"""Span-level evaluation of the entity recognizer
+
+Compares predicted (start, end, label) character spans with gold spans and
+reports precision, recall and F1 per label, in two flavours:
+
+* exact: a prediction counts only if its offsets and label match a gold span
+* overlap: a prediction counts if it overlaps a gold span with the same label
+  (and a gold span is found if any prediction with its label overlaps it)
+
+Exact matches are looked up in a set. Overlaps are found per label by
+sorting the spans by start offset and binary searching, so a document costs
+O((n + m) log n) instead of comparing every prediction with every gold span.
+
+    python evaluation.py Aici gold.jsonl -j 4
+
+where gold.jsonl is training data in the format written by annotate.py.
+"""
+from __future__ import unicode_literals, print_function
+
+import io
+import json
+import plac
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+
+from snapshot import bounded_imap, chunked, load_model, model_pool
+
+COUNTS = ('gold', 'pred', 'exact', 'pred_overlap', 'gold_overlap')
+
+
+def _overlapping(spans, others):
+    """Count the spans that overlap at least one of `others`. Both lists hold
+    (start, end) pairs."""
+    if not spans or not others:
+        return 0
+    others = sorted(others)
+    starts = [start for start, end in others]
+    # furthest end among the spans starting at or before each position
+    max_ends = []
+    furthest = 0
+    for start, end in others:
+        furthest = max(furthest, end)
+        max_ends.append(furthest)
+    count = 0
+    for start, end in spans:
+        # others starting before this span ends are the only candidates
+        i = bisect_left(starts, end)
+        if i and max_ends[i - 1] > start:
+            count += 1
+    return count
+
+
+class Scorer(object):
+    """Accumulates span counts per label over any number of documents."""
+
+    def __init__(self):
+        self.counts = defaultdict(lambda: dict.fromkeys(COUNTS, 0))
+
+    def score(self, gold, pred):
+        """Add one document, given its gold and predicted (start, end, label)
+        spans."""
+        gold = set(map(tuple, gold))
+        pred = set(map(tuple, pred))
+        gold_by_label = defaultdict(list)
+        pred_by_label = defaultdict(list)
+        for start, end, label in gold:
+            gold_by_label[label].append((start, end))
+        for start, end, label in pred:
+            pred_by_label[label].append((start, end))
+        for start, end, label in gold & pred:
+            self.counts[label]['exact'] += 1
+        for label in set(gold_by_label) | set(pred_by_label):
+            label_gold = gold_by_label[label]
+            label_pred = pred_by_label[label]
+            counts = self.counts[label]
+            counts['gold'] += len(label_gold)
+            counts['pred'] += len(label_pred)
+            counts['pred_overlap'] += _overlapping(label_pred, label_gold)
+            counts['gold_overlap'] += _overlapping(label_gold, label_pred)
+
+    def merge(self, other):
+        for label, counts in other.counts.items():
+            for key in COUNTS:
+                self.counts[label][key] += counts[key]
+        return self
+
+    def to_dict(self):
+        """Plain dict of the raw counts, to send across processes."""
+        return {label: dict(counts) for label, counts in self.counts.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        scorer = cls()
+        for label, counts in data.items():
+            scorer.counts[label].update(counts)
+        return scorer
+
+    def scores(self):
+        """Precision, recall and F1 per label and micro-averaged over all
+        labels (under the key 'ALL'), for exact and overlap matching."""
+        totals = dict.fromkeys(COUNTS, 0)
+        results = {}
+        for label, counts in sorted(self.counts.items()):
+            for key in COUNTS:
+                totals[key] += counts[key]
+            results[label] = _prf(counts)
+        results['ALL'] = _prf(totals)
+        return results
+
+
+def _prf(counts):
+    def f1(p, r):
+        return 2 * p * r / (p + r) if p + r else 0.0
+
+    def div(a, b):
+        return float(a) / b if b else 0.0
+
+    exact_p = div(counts['exact'], counts['pred'])
+    exact_r = div(counts['exact'], counts['gold'])
+    overlap_p = div(counts['pred_overlap'], counts['pred'])
+    overlap_r = div(counts['gold_overlap'], counts['gold'])
+    return {'exact': {'p': exact_p, 'r': exact_r, 'f': f1(exact_p, exact_r)},
+            'overlap': {'p': overlap_p, 'r': overlap_r,
+                        'f': f1(overlap_p, overlap_r)}}
+
+
+def doc_spans(doc):
+    return [(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents]
+
+
+def score_docs(nlp, examples, batch_size=64, scorer=None):
+    """Run `nlp` over (text, gold_entities) pairs and score the predictions."""
+    scorer = scorer if scorer is not None else Scorer()
+    for batch in chunked(examples, batch_size):
+        texts, golds = zip(*batch)
+        for doc, gold in zip(nlp.pipe(texts, batch_size=batch_size), golds):
+            scorer.score(gold, doc_spans(doc))
+    return scorer
+
+
+_worker_nlp = None
+
+
+def _init_worker(model):
+    global _worker_nlp
+    _worker_nlp = load_model(model)
+
+
+def _score_chunk(chunk):
+    return score_docs(_worker_nlp, chunk).to_dict()
+
+
+def evaluate_model(model, examples, n_process=1, batch_size=64):
+    """Score the model at `model` on (text, gold_entities) pairs, optionally
+    spreading the documents over several processes."""
+    if n_process <= 1:
+        return score_docs(load_model(model), examples, batch_size=batch_size)
+    scorer = Scorer()
+    pool = model_pool(n_process, _init_worker, (model,))
+    try:
+        chunks = chunked(examples, batch_size * 4)
+        for counts in bounded_imap(pool, _score_chunk, chunks, 2 * n_process):
+            scorer.merge(Scorer.from_dict(counts))
+    finally:
+        pool.close()
+        pool.join()
+    return scorer
+
+
+def print_scores(scores):
+    print("%-14s %7s %7s %7s   %7s %7s %7s" % (
+        "label", "P", "R", "F", "P~", "R~", "F~"))
+    for label, result in sorted(scores.items(), key=lambda x: x[0] == 'ALL'):
+        exact, overlap = result['exact'], result['overlap']
+        print("%-14s %7.2f %7.2f %7.2f   %7.2f %7.2f %7.2f" % (
+            label, exact['p'] * 100, exact['r'] * 100, exact['f'] * 100,
+            overlap['p'] * 100, overlap['r'] * 100, overlap['f'] * 100))
+    print("(~ = overlap matching)")
+
+
+def read_examples(path):
+    with io.open(str(path), encoding='utf8') as file_:
+        for line in file_:
+            if line.strip():
+                text, annotations = json.loads(line)
+                yield text, annotations['entities']
+
+
+@plac.annotations(
+    model=("Model directory", "positional", None, str),
+    gold_path=("Gold data in the JSONL format written by annotate.py", "positional", None, Path),
+    n_process=("Number of worker processes", "option", "j", int),
+    batch_size=("Number of documents per nlp.pipe batch", "option", "b", int))
+
+def main(model, gold_path, n_process=1, batch_size=64):
+    scorer = evaluate_model(model, read_examples(gold_path),
+                            n_process=n_process, batch_size=batch_size)
+    print_scores(scorer.scores())
+
+
+if __name__ == '__main__':
+    plac.call(main)
@@ -1,5 +1,4 @@
 import spacy
-import csv
 import random
 
 nlp = spacy.load('en')
@@ -10,37 +9,10 @@ nlp = spacy.load('en')
 
 # doc = nlp(data)
 
-# dictionary = {}
-# with open('nationalities.csv', 'r', encoding='utf8') as csvfile:
-#     csvreader = csv.reader(csvfile, delimiter=',')
-#     for row in csvreader:
-#     	k, v = row
-#     	dictionary[k] = v
-
-# #religions to filter out
-# religions = []
-# with open('religions.txt', 'r') as file:
-#     reader = file.read()
-#     reader = reader[0:len(reader)]
-#     words = str(reader).split("\n")
-#     for word in words:
-#     	religions.append(word)
-
-
-# nationalities = set()
-# nations = set()
-# later_nations = set()
-
-# for token in doc.ents:
-# 	if token.label_ is "NORP":
-# 		if token.text not in religions:
-# 			nationalities.add(token.text)
-# 	if token.label_ is "GPE":
-# 		nations.add(token.text)
-
-# for nationality in nationalities:
-# 	if nationality in dictionary:
-# 		later_nations.add(dictionary[nationality])
+# # NORP/GPE -> nation lookups go through the compiled gazetteer
+# # (nationalities.csv + religions.txt), see gazetteer.py
+# from gazetteer import resolve_nations
+# nationalities, nations, later_nations = resolve_nations(doc)
 
 TRAIN_DATA = [
      ("Holy Roman Empire was founded that day", {'entities': [(0, 17, 'LOC')]}),
@@ -0,0 +1,292 @@
+"""Extract battle entities from a collection of articles
+
+Loads the trained model (Aici/ by default) once and streams the articles
+through `nlp.pipe`. The input is either a directory of .txt article dumps
+(articles separated by `---` lines, like Test.txt) or a JSONL file with a
+"text" (and optionally an "id") field per line. One JSON record per article
+is written to the output file, with the entities grouped the same way
+historical_battle.py prints them.
+
+    python extract.py articles/ entities.jsonl -m Aici -b 64 -j 4
+
+With more than one process, workers are handed chunks of articles and the
+output keeps the input order. Where processes are forked, the model is
+loaded once before the workers start and they share it copy-on-write;
+otherwise every worker loads its own copy.
+
+The model is loaded with snapshot.load_model(), so spaCy is only imported
+once it is needed and an up-to-date Aici.snapshot (see snapshot.py) is
+used when there is one. The time from start-up to the first record is
+reported at the end.
+
+`-r` adds the rule-based BATTLE/DATE pre-pass of rules.py to the pipeline.
+`-l` keeps only the given labels; with `-r`, articles where the rules found
+all of them don't go through the NER at all:
+
+    python extract.py articles/ dates.jsonl -r -l BATTLE,DATE
+"""
+from __future__ import unicode_literals, print_function
+
+import io
+import json
+import plac
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+# the time to the first record is measured from here
+STARTED = time.time()
+
+from cache import ExtractionCache, text_key
+from chunking import make_windows, merge_windows
+from corpus import Corpus
+from profiling import Profiler, profiled_pipe
+from rules import add_rules, rule_pipe
+from snapshot import bounded_imap, chunked, load_model, model_pool
+
+# entity label -> name of the group it goes into
+BUCKETS = OrderedDict([
+    ('BATTLE', 'battle_names'),
+    ('DATE', 'dates'),
+    ('LOCATION', 'locations'),
+    ('BELLIGERENT1', 'first_army'),
+    ('BELLIGERENT2', 'second_army'),
+    ('LEADER', 'leaders'),
+    ('RESULT', 'results'),
+])
+
+
+def group_entities(doc):
+    """Group the entities of a Doc into a set of texts per bucket."""
+    return _group(doc_entities(doc))
+
+
+def doc_entities(doc):
+    """(start, end, label, text) for every entity of a Doc."""
+    return [(ent.start_char, ent.end_char, ent.label_, ent.text)
+            for ent in doc.ents]
+
+
+def _group(entities):
+    groups = OrderedDict((name, set()) for name in BUCKETS.values())
+    for start, end, label, text in entities:
+        name = BUCKETS.get(label)
+        if name is not None:
+            groups[name].add(text)
+    return groups
+
+
+def entities_to_record(entities, id_=None):
+    record = OrderedDict()
+    if id_ is not None:
+        record['id'] = id_
+    for name, texts in _group(entities).items():
+        record[name] = sorted(texts)
+    return record
+
+
+def to_record(doc, id_=None):
+    return entities_to_record(doc_entities(doc), id_)
+
+
+def read_articles(input_path):
+    """Yield (id, text) pairs from a directory of dumps or a JSONL file."""
+    input_path = Path(input_path)
+    if input_path.is_dir():
+        for path in sorted(input_path.glob('*.txt')):
+            for article in Corpus(path):
+                yield '%s#%d' % (path.name, article.index), article.text
+    else:
+        with io.open(str(input_path), encoding='utf8') as file_:
+            for i, line in enumerate(file_):
+                if line.strip():
+                    record = json.loads(line)
+                    yield record.get('id', i), record['text']
+
+
+_worker_nlp = None
+_worker_batch_size = None
+_worker_profiler = None
+_worker_rules = False
+_worker_labels = None
+
+
+def _init_worker(model, batch_size, profiler=None, rules=False, labels=None):
+    global _worker_nlp, _worker_batch_size, _worker_profiler
+    global _worker_rules, _worker_labels
+    start = time.time()
+    _worker_nlp = load_model(model)
+    if rules:
+        add_rules(_worker_nlp)
+    _worker_batch_size = batch_size
+    _worker_profiler = profiler
+    _worker_rules = rules
+    _worker_labels = labels
+    if profiler is not None:
+        profiler.record('load_model', time.time() - start)
+
+
+def _extract_chunk(chunk):
+    """Run the uncached texts of a chunk through the pipeline. Takes
+    (id, key, text or record, cached, offset, n_parts) tuples and returns
+    them with the text replaced by (window_start, window_end, entities)."""
+    todo = [text for id_, key, text, cached, offset, n_parts in chunk
+            if not cached]
+    if _worker_profiler is not None:
+        docs = iter(profiled_pipe(_worker_nlp, todo, _worker_profiler,
+                                  batch_size=_worker_batch_size))
+    elif _worker_rules:
+        docs = iter(rule_pipe(_worker_nlp, todo, batch_size=_worker_batch_size,
+                              labels=_worker_labels))
+    else:
+        docs = iter(_worker_nlp.pipe(todo, batch_size=_worker_batch_size))
+    results = []
+    for id_, key, value, cached, offset, n_parts in chunk:
+        if not cached:
+            entities = [(start + offset, end + offset, label, text)
+                        for start, end, label, text in doc_entities(next(docs))
+                        if not _worker_labels or label in _worker_labels]
+            value = (offset, offset + len(value), entities)
+        results.append((id_, key, value, cached, n_parts))
+    return results
+
+
+def _prepare(articles, cache, max_chars, overlap):
+    """Look the articles up in the cache and cut the long ones into
+    windows."""
+    for id_, text in articles:
+        key = None
+        if cache is not None:
+            key = text_key(text)
+            record = cache.get(text, key=key)
+            if record is not None:
+                yield id_, key, record, True, 0, 1
+                continue
+        if not max_chars or len(text) <= max_chars:
+            yield id_, key, text, False, 0, 1
+            continue
+        windows = make_windows(text, max_chars=max_chars, overlap=overlap)
+        for start, end in windows:
+            yield id_, key, text[start:end], False, start, len(windows)
+
+
+def extract(articles, model='Aici', batch_size=64, n_process=1, cache=None,
+            profiler=None, max_chars=20000, overlap=1, rules=False,
+            labels=None):
+    """Yield one record per (id, text) pair, in input order. Articles found
+    in `cache` (an ExtractionCache) skip the pipeline, new results are added
+    to it. A profiling.Profiler times model loading, tokenization and every
+    pipeline component; it only works in a single process.
+
+    Articles longer than `max_chars` are split into sentence-aligned windows
+    sharing `overlap` sentences (see chunking.py). The windows are processed
+    like separate articles, so they spread over the workers, and their
+    entities are merged back into one record.
+
+    `rules` adds the BATTLE/DATE pre-pass of rules.py; `labels` keeps only
+    entities with those labels and, with `rules`, skips the NER for the
+    articles (or windows) where the rules found all of them."""
+    items = _prepare(articles, cache, max_chars, overlap)
+    if n_process <= 1 or profiler is not None:
+        _init_worker(model, batch_size, profiler, rules, labels)
+        chunks = chunked(items, batch_size)
+        results = (_extract_chunk(chunk) for chunk in chunks)
+        pool = None
+    else:
+        pool = model_pool(n_process, _init_worker,
+                          (model, batch_size, None, rules, labels))
+        # a few batches per task, so the workers aren't starved by the IPC
+        chunks = chunked(items, batch_size * 4)
+        results = bounded_imap(pool, _extract_chunk, chunks, 2 * n_process)
+    try:
+        windows = []
+        for chunk in results:
+            for id_, key, value, cached, n_parts in chunk:
+                if cached:
+                    record = value
+                else:
+                    # the windows of an article arrive one after the other
+                    windows.append(value)
+                    if len(windows) < n_parts:
+                        continue
+                    if n_parts == 1:
+                        entities = windows[0][2]
+                    else:
+                        entities = merge_windows(windows)
+                    windows = []
+                    record = entities_to_record(entities)
+                    if cache is not None:
+                        cache.put(None, record, key=key)
+                output = OrderedDict([('id', id_)])
+                output.update(record)
+                yield output
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+@plac.annotations(
+    input_path=("Directory of .txt dumps or a JSONL file", "positional", None, Path),
+    output_path=("Output JSONL file", "positional", None, Path),
+    model=("Model directory", "option", "m", str),
+    batch_size=("Number of articles per nlp.pipe batch", "option", "b", int),
+    n_process=("Number of worker processes", "option", "j", int),
+    cache_path=("Optional result cache file", "option", "c", Path),
+    cache_size=("Maximum size of the result cache in MB", "option", "cs", int),
+    profile_path=("Write a timing report to this .json or .csv file", "option", "p", Path),
+    max_chars=("Split longer articles into windows of this many characters (0 = never)", "option", "w", int),
+    overlap=("Number of sentences shared by neighbouring windows", "option", "ov", int),
+    rules=("Find BATTLE and DATE spans with patterns before the NER", "flag", "r"),
+    labels=("Comma-separated labels to keep (default: all)", "option", "l", str))
+
+def main(input_path, output_path, model='Aici', batch_size=64, n_process=1,
+         cache_path=None, cache_size=1024, profile_path=None, max_chars=20000,
+         overlap=1, rules=False, labels=None):
+    if labels:
+        labels = [label.strip() for label in labels.split(',') if label.strip()]
+    profiler = None
+    if profile_path is not None:
+        profiler = Profiler()
+        if n_process > 1:
+            print("Profiling runs in a single process, ignoring -j")
+    cache = None
+    if cache_path is not None:
+        # windowing changes the entities of long articles too
+        variant = 'max_chars=%d overlap=%d' % (max_chars, overlap)
+        if rules or labels:
+            variant += ' rules=%s labels=%s' % (rules, ','.join(labels or []))
+        cache = ExtractionCache(cache_path, model,
+                                max_bytes=cache_size * 1024 * 1024,
+                                variant=variant)
+    start = time.time()
+    n_docs = 0
+    first_record = None
+    try:
+        with io.open(str(output_path), 'w', encoding='utf8') as output:
+            for record in extract(read_articles(input_path), model=model,
+                                  batch_size=batch_size, n_process=n_process,
+                                  cache=cache, profiler=profiler,
+                                  max_chars=max_chars, overlap=overlap,
+                                  rules=rules, labels=labels):
+                output.write(json.dumps(record) + '\n')
+                n_docs += 1
+                if first_record is None:
+                    first_record = time.time()
+    finally:
+        if cache is not None:
+            cache.close()
+    elapsed = time.time() - start
+    print("Extracted %d articles in %.1fs (%.1f docs/sec)" % (
+        n_docs, elapsed, n_docs / elapsed if elapsed else 0.0))
+    if first_record is not None:
+        print("First record %.3fs after start-up" % (first_record - STARTED))
+    if cache is not None:
+        print(cache.report())
+    if profiler is not None:
+        profiler.write(profile_path)
+        print("Wrote profile to", profile_path)
+
+
+if __name__ == '__main__':
+    plac.call(main)
@@ -0,0 +1,194 @@
+"""Incrementally fine-tune the saved model on new annotations
+
+Instead of retraining from a blank model every time the training set grows,
+this loads the saved model (Aici/ by default) and updates it only on the
+articles it hasn't been trained on yet. The training file is JSONL in the
+format annotate.py writes, and new articles are simply appended to it. The
+SHA-1 of every article the model has seen is kept in `training_state.json`
+inside the model directory.
+
+To limit forgetting, a random sample of the articles the model has already
+seen (and of TRAIN_DATA) is mixed in with the new ones.
+
+The model directory becomes a symlink to the current version (Aici ->
+.Aici.2). An update is written to a new version directory and the link is
+switched with a single os.replace, so readers always find either the old or
+the new model, and a crash never leaves a half-written one behind. The
+previous version is kept; older ones are removed.
+
+This changes the layout of the repository: the first update moves the
+tracked Aici/ to .Aici.1, so `git status` lists the files of Aici/ as
+deleted and Aici as a symlink. The version directories (and the temporary
+.Aici.new and .Aici.link) are ignored by .gitignore. To commit a fine-tuned
+model, replace the link with a copy of the version it points to; to go back
+to the committed model, remove the link and `git checkout Aici`.
+
+    python annotate.py new_phrases.jsonl -c new_articles.txt >> annotated.jsonl
+    python finetune.py annotated.jsonl -m Aici -n 10 -r 1.0
+"""
+from __future__ import unicode_literals, print_function
+
+import io
+import json
+import os
+import plac
+import random
+import shutil
+from pathlib import Path
+
+import spacy
+
+from cache import text_key
+from historical_battle import LABELS, TRAIN_DATA, add_labels, swap_dirs, train
+
+STATE_FILE = 'training_state.json'
+
+
+def read_state(model_dir):
+    path = Path(model_dir) / STATE_FILE
+    if not path.exists():
+        return {'seen': []}
+    with path.open('r', encoding='utf8') as file_:
+        return json.load(file_)
+
+
+def split_examples(path, seen, n_rehearse):
+    """Read the training JSONL once. Returns the examples not in `seen` and
+    a random sample of up to `n_rehearse` of the ones that are, picked with
+    reservoir sampling so the old examples never all sit in memory."""
+    new = []
+    sample = []
+    n_old = 0
+    with io.open(str(path), encoding='utf8') as file_:
+        for line in file_:
+            if not line.strip():
+                continue
+            text, annotations = json.loads(line)
+            example = (text, {'entities': [tuple(e) for e in
+                                           annotations['entities']]})
+            if text_key(text) not in seen:
+                new.append(example)
+                continue
+            n_old += 1
+            if len(sample) < n_rehearse:
+                sample.append(example)
+            else:
+                i = random.randint(0, n_old - 1)
+                if i < n_rehearse:
+                    sample[i] = example
+    return new, sample
+
+
+def version_dirs(model_dir):
+    """The saved versions of `model_dir` (.Aici.1, .Aici.2, ...), oldest
+    first."""
+    prefix = '.%s.' % model_dir.name
+    versions = []
+    for path in model_dir.parent.iterdir():
+        number = path.name[len(prefix):]
+        if path.name.startswith(prefix) and number.isdigit():
+            versions.append((int(number), path))
+    return [path for _, path in sorted(versions)]
+
+
+def next_version_dir(model_dir):
+    versions = version_dirs(model_dir)
+    number = int(versions[-1].name.rsplit('.', 1)[1]) + 1 if versions else 1
+    return model_dir.parent / ('.%s.%d' % (model_dir.name, number))
+
+
+def point_to(model_dir, version_dir):
+    """Make `model_dir` a symlink to `version_dir` in one step, replacing
+    the link that is there."""
+    tmp_link = model_dir.parent / ('.%s.link' % model_dir.name)
+    if os.path.lexists(str(tmp_link)):
+        os.remove(str(tmp_link))
+    os.symlink(version_dir.name, str(tmp_link), target_is_directory=True)
+    os.replace(str(tmp_link), str(model_dir))
+
+
+def recover(model_dir):
+    """Put `model_dir` back if a save was interrupted while it was
+    missing."""
+    model_dir = Path(os.path.abspath(str(model_dir)))
+    if model_dir.exists():
+        return
+    versions = version_dirs(model_dir)
+    old_dir = model_dir.parent / ('.%s.old' % model_dir.name)
+    if versions:
+        point_to(model_dir, versions[-1])
+    elif old_dir.exists():
+        os.rename(str(old_dir), str(model_dir))
+
+
+def save_atomic(nlp, model_dir, state):
+    """Write the model to a new version directory and switch the
+    `model_dir` symlink to it."""
+    model_dir = Path(os.path.abspath(str(model_dir)))
+    recover(model_dir)
+    tmp_dir = model_dir.parent / ('.%s.new' % model_dir.name)
+    if tmp_dir.exists():
+        shutil.rmtree(str(tmp_dir))
+    nlp.to_disk(tmp_dir)
+    with (tmp_dir / STATE_FILE).open('w', encoding='utf8') as file_:
+        file_.write(json.dumps(state))
+    if not model_dir.is_symlink():
+        # the first update: the model directory becomes the first version
+        first_dir = next_version_dir(model_dir)
+        os.rename(str(model_dir), str(first_dir))
+        try:
+            point_to(model_dir, first_dir)
+        except OSError:
+            # no symlinks here (e.g. Windows without the privilege);
+            # recover() restores .Aici.old if a crash hits the swap
+            os.rename(str(first_dir), str(model_dir))
+            swap_dirs(model_dir, tmp_dir)
+            return
+    # only complete versions get a number
+    new_dir = next_version_dir(model_dir)
+    os.rename(str(tmp_dir), str(new_dir))
+    point_to(model_dir, new_dir)
+    # the previous version stays for readers that are still loading it
+    for path in version_dirs(model_dir)[:-2]:
+        shutil.rmtree(str(path))
+
+
+@plac.annotations(
+    train_path=("Training data in the JSONL format written by annotate.py", "positional", None, Path),
+    model=("Model directory to update", "option", "m", Path),
+    n_iter=("Number of training iterations", "option", "n", int),
+    rehearsal=("Old examples to mix in per new example", "option", "r", float),
+    max_rehearsal=("Maximum number of old examples to mix in", "option", "rm", int),
+    drop=("Dropout rate", "option", "d", float))
+
+def main(train_path, model=Path('Aici'), n_iter=10, rehearsal=1.0,
+         max_rehearsal=1000, drop=0.35):
+    recover(model)
+    state = read_state(model)
+    seen = set(state['seen'])
+    new, sample = split_examples(train_path, seen, max_rehearsal)
+    if not new:
+        print("No new articles in", train_path)
+        return
+
+    # the articles the model was first trained on count as old data too
+    old = sample + list(TRAIN_DATA)
+    random.shuffle(old)
+    rehearse = old[:min(max_rehearsal, int(round(len(new) * rehearsal)))]
+    print("Fine-tuning on %d new and %d rehearsal articles" % (
+        len(new), len(rehearse)))
+
+    nlp = spacy.load(str(model))
+    ner = nlp.get_pipe('ner')
+    add_labels(ner, LABELS)
+    # begin_training would re-initialise the weights
+    optimizer = ner.create_optimizer()
+    train(nlp, optimizer, new + rehearse, n_iter=n_iter, drop=drop)
+
+    state['seen'] = sorted(seen | set(text_key(text) for text, _ in new))
+    save_atomic(nlp, model, state)
+    print("Saved model to", model)
+
+
+if __name__ == '__main__':
+    plac.call(main)
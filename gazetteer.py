@@ -0,0 +1,267 @@
+"""Compiled nationality/nation/religion gazetteer
+
+nationalities.csv and religions.txt are compiled into a single binary file
+holding an open-addressing hash table, which is memory-mapped on first use
+instead of being parsed into a dict every time. Keys are lowercased with
+their whitespace normalised, so lookups are case-insensitive and a lookup is
+a hash plus (usually) one probe.
+
+    gazetteer = load_gazetteer()
+    gazetteer.lookup('french')            # (NATIONALITY, 'France')
+    nationalities, nations, later_nations = resolve_nations(doc)
+
+The file is rebuilt automatically when one of the source files is newer.
+
+File layout (little endian):
+
+    magic 'GZT1' | n_slots u32 | max_tokens u32 | n_entries u32
+    n_slots * (key_offset u32, value_offset u32)   0xFFFFFFFF = empty slot
+    string blob: every string is a u16 byte length followed by UTF-8 bytes,
+    every value is a u8 kind followed by a string
+"""
+from __future__ import unicode_literals, print_function
+
+import csv
+import io
+import mmap
+import os
+import plac
+import struct
+import zlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+NATIONALITIES_PATH = os.path.join(HERE, 'nationalities.csv')
+RELIGIONS_PATH = os.path.join(HERE, 'religions.txt')
+GAZETTEER_PATH = os.path.join(HERE, 'gazetteer.bin')
+
+MAGIC = b'GZT1'
+HEADER = struct.Struct('<4sIII')
+SLOT = struct.Struct('<II')
+EMPTY = 0xFFFFFFFF
+
+# entry kinds
+NATIONALITY = 1
+NATION = 2
+RELIGION = 3
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def _hash(key):
+    return zlib.crc32(key) & 0xFFFFFFFF
+
+
+def read_sources(nationalities_path=NATIONALITIES_PATH,
+                 religions_path=RELIGIONS_PATH):
+    """Yield (surface form, kind, value) for every gazetteer entry."""
+    with io.open(nationalities_path, encoding='utf8', newline='') as file_:
+        reader = csv.reader(file_)
+        next(reader, None)  # Nationality,Nation header
+        for row in reader:
+            if len(row) != 2:
+                continue
+            nationality, nation = row
+            yield nationality, NATIONALITY, nation
+            yield nation, NATION, nation
+    with io.open(religions_path, encoding='utf8') as file_:
+        for line in file_:
+            if line.strip():
+                yield line.strip(), RELIGION, line.strip()
+
+
+def build(output_path=GAZETTEER_PATH, nationalities_path=NATIONALITIES_PATH,
+          religions_path=RELIGIONS_PATH):
+    entries = {}
+    for surface, kind, value in read_sources(nationalities_path, religions_path):
+        key = normalize(surface)
+        # religions always win, so they are filtered out like before; a
+        # nationality beats a nation with the same spelling
+        if key not in entries or kind == RELIGION or \
+                (kind == NATIONALITY and entries[key][0] == NATION):
+            entries[key] = (kind, value)
+
+    n_slots = 1
+    while n_slots < len(entries) * 2:
+        n_slots *= 2
+    blob = bytearray()
+    slots = [(EMPTY, EMPTY)] * n_slots
+    strings = {}
+
+    def add_string(data):
+        if data not in strings:
+            strings[data] = len(blob)
+            blob.extend(struct.pack('<H', len(data)))
+            blob.extend(data)
+        return strings[data]
+
+    max_tokens = 1
+    for key, (kind, value) in sorted(entries.items()):
+        key_bytes = key.encode('utf8')
+        max_tokens = max(max_tokens, len(key.split()))
+        key_offset = add_string(key_bytes)
+        value_bytes = value.encode('utf8')
+        value_offset = len(blob)
+        blob.extend(struct.pack('<BH', kind, len(value_bytes)))
+        blob.extend(value_bytes)
+        slot = _hash(key_bytes) & (n_slots - 1)
+        while slots[slot][0] != EMPTY:
+            slot = (slot + 1) & (n_slots - 1)
+        slots[slot] = (key_offset, value_offset)
+
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as file_:
+        file_.write(HEADER.pack(MAGIC, n_slots, max_tokens, len(entries)))
+        for key_offset, value_offset in slots:
+            file_.write(SLOT.pack(key_offset, value_offset))
+        file_.write(bytes(blob))
+    os.replace(tmp_path, output_path)
+    return len(entries)
+
+
+class Gazetteer(object):
+    """Read-only view of a compiled gazetteer file. The file is opened and
+    memory-mapped on the first lookup."""
+
+    def __init__(self, path=GAZETTEER_PATH):
+        self.path = path
+        self._data = None
+
+    def _open(self):
+        with open(self.path, 'rb') as file_:
+            self._data = mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._n_slots, self._max_tokens, self._n_entries = \
+            HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            raise ValueError("%s is not a gazetteer file" % self.path)
+        self._blob_start = HEADER.size + self._n_slots * SLOT.size
+
+    # the header fields are only known once the file is open
+    @property
+    def n_slots(self):
+        self.data
+        return self._n_slots
+
+    @property
+    def max_tokens(self):
+        self.data
+        return self._max_tokens
+
+    @property
+    def n_entries(self):
+        self.data
+        return self._n_entries
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._open()
+        return self._data
+
+    def _string(self, offset):
+        start = self._blob_start + offset
+        length, = struct.unpack_from('<H', self.data, start)
+        return self.data[start + 2:start + 2 + length]
+
+    def lookup(self, text):
+        """Return (kind, value) for a surface form, or None."""
+        data = self.data
+        key = normalize(text).encode('utf8')
+        mask = self.n_slots - 1
+        slot = _hash(key) & mask
+        while True:
+            key_offset, value_offset = SLOT.unpack_from(
+                data, HEADER.size + slot * SLOT.size)
+            if key_offset == EMPTY:
+                return None
+            if self._string(key_offset) == key:
+                start = self._blob_start + value_offset
+                kind = data[start]
+                value = self._string(value_offset + 1).decode('utf8')
+                return kind, value
+            slot = (slot + 1) & mask
+
+    def __contains__(self, text):
+        return self.lookup(text) is not None
+
+    def match_tokens(self, words):
+        """Find the longest gazetteer entries in a sequence of words, left to
+        right. Yields (start, end, kind, value) with word indices."""
+        i = 0
+        while i < len(words):
+            for n in range(min(self.max_tokens, len(words) - i), 0, -1):
+                entry = self.lookup(' '.join(words[i:i + n]))
+                if entry is not None:
+                    yield (i, i + n) + entry
+                    i += n
+                    break
+            else:
+                i += 1
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+
+
+_gazetteer = None
+
+
+def load_gazetteer(path=GAZETTEER_PATH):
+    """Shared Gazetteer instance, (re)building the file if it is missing or
+    older than the source files."""
+    global _gazetteer
+    if _gazetteer is None or _gazetteer.path != path:
+        sources = [NATIONALITIES_PATH, RELIGIONS_PATH]
+        if not os.path.exists(path) or any(
+                os.path.getmtime(source) > os.path.getmtime(path)
+                for source in sources):
+            build(path)
+        _gazetteer = Gazetteer(path)
+    return _gazetteer
+
+
+def resolve_nations(doc, gazetteer=None):
+    """Map the NORP and GPE entities of a Doc to nations.
+
+    Returns (nationalities, nations, later_nations): the NORP entities that
+    aren't religions, the GPE entities, and the nations the nationalities
+    belong to.
+    """
+    gazetteer = gazetteer or load_gazetteer()
+    nationalities = set()
+    nations = set()
+    later_nations = set()
+    for ent in doc.ents:
+        if ent.label_ == 'NORP':
+            entry = gazetteer.lookup(ent.text)
+            if entry is not None and entry[0] == RELIGION:
+                continue
+            nationalities.add(ent.text)
+            if entry is not None:
+                later_nations.add(entry[1])
+        elif ent.label_ == 'GPE':
+            nations.add(ent.text)
+    return nationalities, nations, later_nations
+
+
+def match_doc(doc, gazetteer=None):
+    """Gazetteer entries anywhere in a Doc, including ones the entity
+    recognizer missed, as (Span, kind, value) tuples."""
+    gazetteer = gazetteer or load_gazetteer()
+    words = [token.text for token in doc]
+    return [(doc[start:end], kind, value)
+            for start, end, kind, value in gazetteer.match_tokens(words)]
+
+
+@plac.annotations(
+    output_path=("Where to write the compiled gazetteer", "option", "o", str))
+
+def main(output_path=GAZETTEER_PATH):
+    n_entries = build(output_path)
+    print("Wrote %d entries to %s" % (n_entries, output_path))
+
+
+if __name__ == '__main__':
+    plac.call(main)
@@ -23,14 +23,20 @@ Compatible with: spaCy v2.0.0+
 """
 from __future__ import unicode_literals, print_function
 
+import os
 import plac
 import random
+import shutil
+import time
 from pathlib import Path
 import spacy
+from spacy.util import minibatch, compounding
 
-train_text = []
-with open('Training.txt', 'r') as myfile:
-    train_text = myfile.read().replace('\n', '').split('---')
+from corpus import Corpus, Examples
+from annotate import compile_spans
+from evaluation import Scorer, doc_spans, print_scores, read_examples
+from extract import group_entities
+from profiling import Profiler
 
 # new entity labels
 LABEL1 = 'BELLIGERENT1'
@@ -40,29 +46,65 @@ LABEL4 = 'DATE'
 LABEL5 = 'LEADER'
 LABEL6 = 'RESULT'
 LABEL7 = 'BELLIGERENT2'
-
-TRAIN_DATA = [
-     (train_text[0], {'entities': [(0, 22, 'BATTLE'), (45, 57, 'DATE'), (59, 72, 'LOCATION'), (114, 147, 'LOCATION'), (151, 162, 'BELLIGERENT1'), (184, 202, 'LEADER'), (244, 261, 'BELLIGERENT2'), (314, 332, 'LEADER'), (340, 353, 'BELLIGERENT2'), (375, 404, 'LEADER'), (449, 475, 'RESULT')]}),
-     (train_text[1], {'entities': [(0, 22, 'BATTLE'), (37, 61, 'BATTLE'), (76, 105, 'LOCATION'), (157, 175, 'DATE'), (185, 218, 'LEADER'), (221, 246, 'BELLIGERENT1'), (251, 284, 'BELLIGERENT2'), (287, 306, 'LEADER'), (308, 323, 'LOCATION'), (325, 333, 'LOCATION'), (338, 352, 'LOCATION'), (392, 506, 'RESULT'), (584, 616, 'RESULT')]}),
-     (train_text[2], {'entities': [(0, 21, 'BATTLE'), (25, 46, 'BATTLE'), (63, 84, 'DATE'), (86, 104, 'LOCATION'), (106, 166, 'BELLIGERENT1'), (175, 201, 'LEADER'), (206, 243, 'LEADER'), (269, 280, 'BELLIGERENT2'), (284, 317, 'LEADER'), (448, 491, 'RESULT'), (564, 609, 'RESULT'), (792, 823, 'RESULT')]}),
-     (train_text[3], {'entities': [(0, 24, 'BATTLE'), (26, 58, 'DATE'), (115, 137, 'BELLIGERENT1'), (149, 161, 'BELLIGERENT2'), (177, 199, 'LOCATION'), (216, 234, 'LOCATION'), (410, 451, 'RESULT'), (493, 537, 'RESULT'), (1074, 1102, 'LOCATION'), (1387, 1399, 'LEADER')]}),
-     (train_text[4], {'entities': [(0, 21, 'BATTLE'), (41, 59, 'BATTLE'), (105, 129, 'BATTLE'), (141, 157, 'DATE'), (162, 180, 'LOCATION'), (228, 253, 'BELLIGERENT1'), (268, 293, 'LEADER'), (298, 309, 'BELLIGERENT1'), (328, 347, 'LEADER'), (355, 367, 'BELLIGERENT2'), (398, 435, 'LEADER'), (502, 592, 'RESULT'), (737, 823, 'RESULT'), (836, 897, 'RESULT')]}),
-     (train_text[5], {'entities': [(0, 25, 'BATTLE'), (48, 77, 'BELLIGERENT1'), (86, 109, 'LEADER'), (119, 133, 'BELLIGERENT2'), (137, 145, 'LEADER'), (292, 318, 'DATE'), (323, 361, 'LOCATION'), (687, 699, 'LEADER')]}),
-     (train_text[6], {'entities': [(0, 24, 'BATTLE'), (120, 168, 'DATE'), (181, 196, 'BELLIGERENT1'), (204, 221, 'LEADER'), (226, 242, 'BELLIGERENT2'), (250, 266, 'LEADER'), (794, 834, 'LOCATION'), (889, 923, 'LOCATION'), (1097, 1142, 'RESULT')]}),
-     (train_text[7], {'entities': [(0, 20, 'BATTLE'), (35, 46, 'DATE'), (48, 67, 'BELLIGERENT1'), (75, 118, 'LEADER'), (166, 196, 'LEADER'), (198, 215, 'BELLIGERENT2')]}),
-     (train_text[8], {'entities': [(0, 21, 'BATTLE'), (25, 37, 'DATE'), (66, 73, 'LEADER'), (77, 83, 'BELLIGERENT1'), (93, 107, 'BELLIGERENT2'), (114, 150, 'LEADER'), (250, 317, 'RESULT'), (325, 407, 'RESULT')]}),
-     (train_text[9], {'entities': [(0, 22, 'BATTLE'), (37, 52, 'DATE'), (66, 73, 'LEADER'), (65, 83, 'BELLIGERENT1'), (87, 116, 'LEADER'), (125, 137, 'BELLIGERENT2'), (148, 181, 'LEADER'), (183, 223, 'RESULT'), (277, 298, 'LOCATION'), (364, 387, 'RESULT')]})
+LABELS = [LABEL1, LABEL2, LABEL3, LABEL4, LABEL5, LABEL6, LABEL7]
+
+# NER sizes for blank models. 'full' is what the saved Aici/ model uses;
+# 'fast' trades some accuracy for speed and a smaller model on disk, and is
+# best trained with distill.py. spaCy 2.0 always builds 4 CNN layers, so
+# the depth isn't configurable here
+PROFILES = {
+    'full': {'token_vector_width': 128, 'hidden_width': 200,
+             'maxout_pieces': 2, 'cnn_maxout_pieces': 3},
+    'fast': {'token_vector_width': 64, 'hidden_width': 64,
+             'maxout_pieces': 1, 'cnn_maxout_pieces': 2, 'embed_size': 2000},
+}
+
+# (article of Training.txt, annotations)
+TRAIN_ANNOTATIONS = [
+     (0, {'entities': [(0, 22, 'BATTLE'), (45, 57, 'DATE'), (59, 72, 'LOCATION'), (114, 147, 'LOCATION'), (151, 162, 'BELLIGERENT1'), (184, 202, 'LEADER'), (244, 261, 'BELLIGERENT2'), (314, 332, 'LEADER'), (340, 353, 'BELLIGERENT2'), (375, 404, 'LEADER'), (449, 475, 'RESULT')]}),
+     (1, {'entities': [(0, 22, 'BATTLE'), (37, 61, 'BATTLE'), (76, 105, 'LOCATION'), (157, 175, 'DATE'), (185, 218, 'LEADER'), (221, 246, 'BELLIGERENT1'), (251, 284, 'BELLIGERENT2'), (287, 306, 'LEADER'), (308, 323, 'LOCATION'), (325, 333, 'LOCATION'), (338, 352, 'LOCATION'), (392, 506, 'RESULT'), (584, 616, 'RESULT')]}),
+     (2, {'entities': [(0, 21, 'BATTLE'), (25, 46, 'BATTLE'), (63, 84, 'DATE'), (86, 104, 'LOCATION'), (106, 166, 'BELLIGERENT1'), (175, 201, 'LEADER'), (206, 243, 'LEADER'), (269, 280, 'BELLIGERENT2'), (284, 317, 'LEADER'), (448, 491, 'RESULT'), (564, 609, 'RESULT'), (792, 823, 'RESULT')]}),
+     (3, {'entities': [(0, 24, 'BATTLE'), (26, 58, 'DATE'), (115, 137, 'BELLIGERENT1'), (149, 161, 'BELLIGERENT2'), (177, 199, 'LOCATION'), (216, 234, 'LOCATION'), (410, 451, 'RESULT'), (493, 537, 'RESULT'), (1074, 1102, 'LOCATION'), (1387, 1399, 'LEADER')]}),
+     (4, {'entities': [(0, 21, 'BATTLE'), (41, 59, 'BATTLE'), (105, 129, 'BATTLE'), (141, 157, 'DATE'), (162, 180, 'LOCATION'), (228, 253, 'BELLIGERENT1'), (268, 293, 'LEADER'), (298, 309, 'BELLIGERENT1'), (328, 347, 'LEADER'), (355, 367, 'BELLIGERENT2'), (398, 435, 'LEADER'), (502, 592, 'RESULT'), (737, 823, 'RESULT'), (836, 897, 'RESULT')]}),
+     (5, {'entities': [(0, 25, 'BATTLE'), (48, 77, 'BELLIGERENT1'), (86, 109, 'LEADER'), (119, 133, 'BELLIGERENT2'), (137, 145, 'LEADER'), (292, 318, 'DATE'), (323, 361, 'LOCATION'), (687, 699, 'LEADER')]}),
+     (6, {'entities': [(0, 24, 'BATTLE'), (120, 168, 'DATE'), (181, 196, 'BELLIGERENT1'), (204, 221, 'LEADER'), (226, 242, 'BELLIGERENT2'), (250, 266, 'LEADER'), (794, 834, 'LOCATION'), (889, 923, 'LOCATION'), (1097, 1142, 'RESULT')]}),
+     (7, {'entities': [(0, 20, 'BATTLE'), (35, 46, 'DATE'), (48, 67, 'BELLIGERENT1'), (75, 118, 'LEADER'), (166, 196, 'LEADER'), (198, 215, 'BELLIGERENT2')]}),
+     (8, {'entities': [(0, 21, 'BATTLE'), (25, 37, 'DATE'), (66, 73, 'LEADER'), (77, 83, 'BELLIGERENT1'), (93, 107, 'BELLIGERENT2'), (114, 150, 'LEADER'), (250, 317, 'RESULT'), (325, 407, 'RESULT')]}),
+     (9, {'entities': [(0, 22, 'BATTLE'), (37, 52, 'DATE'), (65, 83, 'BELLIGERENT1'), (87, 116, 'LEADER'), (125, 137, 'BELLIGERENT2'), (148, 181, 'LEADER'), (183, 223, 'RESULT'), (277, 298, 'LOCATION'), (364, 387, 'RESULT')]})
     ]
 
-
-@plac.annotations(
-    model=("Model name. Defaults to blank 'en' model.", "option", "m", str),
-    new_model_name=("New model name for model meta.", "option", "nm", str),
-    output_dir=("Optional output directory", "option", "o", Path),
-    n_iter=("Number of training iterations", "option", "n", int))
-
-def main(model=None, new_model_name='model', output_dir=None, n_iter=20):
-    """Set up the pipeline and entity recognizer, and train the new entity."""
+# the offsets above were counted on the articles with their newlines removed;
+# Training.txt is only read when the examples are first used
+TRAIN_DATA = Examples('Training.txt', TRAIN_ANNOTATIONS)
+
+
+def add_labels(ner, labels):
+    """Add the labels the entity recognizer doesn't have yet, and keep every
+    label once in cfg['extra_labels']. In spaCy 2.0, add_label() appends the
+    label there once per move it adds (B-, I-, L- and U-), which is why
+    Aici/ner/cfg lists every label four times; nr_class = 7 * 4 + 1 (O) is
+    still right."""
+    extra_labels = ner.cfg.get('extra_labels', [])
+    known = set(extra_labels) | set(getattr(ner, 'labels', ()))
+    known.update(name.split('-', 1)[1] for name in getattr(ner, 'move_names', ())
+                 if '-' in name)
+    for label in labels:
+        if label not in known:
+            ner.add_label(label)
+            known.add(label)
+    if 'extra_labels' in ner.cfg:
+        unique = []
+        for label in ner.cfg['extra_labels']:
+            if label not in unique:
+                unique.append(label)
+        ner.cfg['extra_labels'] = unique
+
+
+def create_model(model=None, profile='full'):
+    """Load `model` (or a blank 'en' model) and make sure it has an entity
+    recognizer with all the battle labels. A new recognizer gets the sizes
+    of PROFILES[profile]. Returns (nlp, optimizer)."""
+    cfg = PROFILES[profile]
     if model is not None:
         nlp = spacy.load(model)  # load existing spaCy model
         print("Loaded model '%s'" % model)
@@ -72,145 +114,291 @@ def main(model=None, new_model_name='model', output_dir=None, n_iter=20):
     # Add entity recognizer to model if it's not in the pipeline
     # nlp.create_pipe works for built-ins that are registered with spaCy
     if 'ner' not in nlp.pipe_names:
-        ner = nlp.create_pipe('ner')
+        ner = nlp.create_pipe('ner', config=cfg)
         nlp.add_pipe(ner)
     # otherwise, get it, so we can add labels to it
     else:
         ner = nlp.get_pipe('ner')
 
-    ner.add_label(LABEL1)   # add new entity labels to entity recognizer
-    ner.add_label(LABEL2)
-    ner.add_label(LABEL3)
-    ner.add_label(LABEL4)
-    ner.add_label(LABEL5)
-    ner.add_label(LABEL6)
-    ner.add_label(LABEL7)
+    add_labels(ner, LABELS)   # add new entity labels to entity recognizer
 
     if model is None:
-        optimizer = nlp.begin_training()
+        optimizer = nlp.begin_training(**cfg)
     else:
         # Note that 'begin_training' initializes the models, so it'll zero out
         # existing entity types.
         optimizer = nlp.entity.create_optimizer()
-
-
+    return nlp, optimizer
+
+
+def train(nlp, optimizer, train_data, n_iter=20, drop=0.35,
+          batch_start=4.0, batch_stop=32.0, batch_compound=1.001,
+          verbose=True, profiler=None, eval_every=0, patience=0,
+          eval_examples=None, checkpoint=None):
+    """Train the entity recognizer on `train_data` in minibatches.
+
+    The batch size starts at `batch_start` and is multiplied by
+    `batch_compound` after every batch until it reaches `batch_stop`. Passing
+    batch_start=batch_stop=1 gives the old one-example-per-update loop.
+    Returns a list with the losses and words/sec of every iteration. If a
+    profiling.Profiler is given, every update and iteration is timed.
+
+    With `eval_every` set, the model is scored on `eval_examples`, a dev
+    split from split_dev(), every that many iterations. Each new best score
+    calls
+    `checkpoint(nlp)`, training stops after `patience` evaluations without
+    improvement (0 = never), and the best weights are restored at the end.
+
+    The other pipes are disabled while the NER trains, but put back for
+    every checkpoint, so a saved checkpoint has the whole pipeline.
+    """
+    train_data = list(train_data)
+    history = []
+    best_score = None
+    best_weights = None
+    bad_evals = 0
+    if eval_every and eval_examples is None:
+        # Test.txt is the final score, it mustn't pick the weights too
+        raise ValueError("eval_every needs eval_examples (see split_dev)")
     # get names of other pipes to disable them during training
     other_pipes = [pipe for pipe in nlp.pipe_names if pipe != 'ner']
-    with nlp.disable_pipes(*other_pipes):  # only train NER
+    disabled = nlp.disable_pipes(*other_pipes)  # only train NER
+    try:
+        # the schedule carries over between iterations, like in `spacy train`
+        sizes = compounding(batch_start, batch_stop, batch_compound)
         for itn in range(n_iter):
-            random.shuffle(TRAIN_DATA)
+            random.shuffle(train_data)
             losses = {}
-            for text, annotations in TRAIN_DATA:
-                nlp.update([text], [annotations], sgd=optimizer, drop=0.35,
+            n_words = 0
+            start = time.time()
+            for batch in minibatch(train_data, size=sizes):
+                texts, annotations = zip(*batch)
+                batch_words = sum(len(text.split()) for text in texts)
+                update_start = time.time()
+                nlp.update(texts, annotations, sgd=optimizer, drop=drop,
                            losses=losses)
-            print(losses)
-
-    # test the trained model
-
-    evaluation_data = [{'location' : 'near Kahlenberg Mountain', 
-                        'name' : 'The Battle of Vienna',
-                        'date' : 'September 12, 1683',
-                        'belligerent1' : 'Polish-Austrian-German forces',
-                        'belligerent2' : 'Ottoman Empire',
-                        'leaders' : ['King of Poland John III Sobieski', 'Grand Vizier Merzifonlu Kara Mustafa Pasha'],
-                        'result' : ['turning point in the 300-year struggle between the forces']},
-                       {'location' : 'Kagoshima, Japan',
-                        'name' : 'The Battle of Shiroyama',
-                        'date' : '24 September 1877',
-                        'belligerent1' : 'Samurai',
-                        'belligerent2' : 'Imperial Japanese Army',
-                        'leaders' : ['Saigo Takamori', 'Yamagata Aritomo', 'Kawamura Sumiyoshi'],
-                        'result' : ['the end of the Satsuma Rebellion', "the annihilation of Saigo's army"]}]
-
-    accuracy = 0.0
-    print(" ")
-
-    for i in range(0, 2):
-        data = []
-        with open('Test.txt', 'r') as myfile:
-            data = myfile.read().replace('\n', '').split('---')
-        doc = nlp(data[i])
-        
-        locations = set()
-        dates = set()
-        first_army = set()
-        second_army = set()
-        results = set()
-        battle_names = set()
-        leaders = set()
-
-        for ent in doc.ents:
-            if ent.label_ == 'BATTLE':
-                battle_names.add(ent.text)
-            elif ent.label_ == 'DATE':
-                dates.add(ent.text)
-            elif ent.label_ == 'BELLIGERENT1':
-                first_army.add(ent.text)
-            elif ent.label_ == 'BELLIGERENT2':
-                second_army.add(ent.text)
-            elif ent.label_ == 'LEADER':
-                leaders.add(ent.text)
-            elif ent.label_ == 'LOCATION':
-                locations.add(ent.text)
-            elif ent.label_ == 'RESULT':
-                results.add(ent.text)
+                if profiler is not None:
+                    profiler.record('update', time.time() - update_start,
+                                    examples=len(texts), words=batch_words)
+                n_words += batch_words
+            elapsed = time.time() - start
+            wps = n_words / elapsed if elapsed else 0.0
+            if profiler is not None:
+                profiler.record('iteration', elapsed, words=n_words,
+                                examples=len(train_data))
+            if verbose:
+                print("%d %s %.0f words/sec" % (itn, losses, wps))
+            history.append({'losses': losses, 'words_per_sec': wps})
+
+            if not eval_every or (itn + 1) % eval_every:
+                continue
+            score = evaluate(nlp, verbose=False, examples=eval_examples)
+            history[-1]['score'] = score
+            if best_score is None or score > best_score:
+                best_score = score
+                best_weights = nlp.get_pipe('ner').to_bytes()
+                bad_evals = 0
+                if verbose:
+                    print("%d F1 %.2f (best)" % (itn, score))
+                if checkpoint is not None:
+                    disabled.restore()
+                    checkpoint(nlp)
+                    disabled = nlp.disable_pipes(*other_pipes)
+            else:
+                bad_evals += 1
+                if verbose:
+                    print("%d F1 %.2f (best %.2f)" % (itn, score, best_score))
+                if patience and bad_evals >= patience:
+                    if verbose:
+                        print("No improvement in %d evaluations, stopping" %
+                              bad_evals)
+                    break
+    finally:
+        disabled.restore()
+    if best_weights is not None:
+        nlp.get_pipe('ner').from_bytes(best_weights)
+    return history
+
+
+EVALUATION_DATA = [{'location' : 'near Kahlenberg Mountain', 
+                    'name' : 'The Battle of Vienna',
+                    'date' : 'September 12, 1683',
+                    'belligerent1' : 'Polish-Austrian-German forces',
+                    'belligerent2' : 'Ottoman Empire',
+                    'leaders' : ['King of Poland John III Sobieski', 'Grand Vizier Merzifonlu Kara Mustafa Pasha'],
+                    'result' : ['turning point in the 300-year struggle between the forces']},
+                   {'location' : 'Kagoshima, Japan',
+                    'name' : 'The Battle of Shiroyama',
+                    'date' : '24 September 1877',
+                    'belligerent1' : 'Samurai',
+                    'belligerent2' : 'Imperial Japanese Army',
+                    'leaders' : ['Saigo Takamori', 'Yamagata Aritomo', 'Kawamura Sumiyoshi'],
+                    'result' : ['the end of the Satsuma Rebellion', "the annihilation of Saigo's army"]}]
+
+
+def split_dev(train_data, dev_path=None, n_dev=2):
+    """Set aside the examples early stopping and checkpoints are scored on,
+    so Test.txt stays unseen until the final score: the gold data in
+    `dev_path` (JSONL as written by annotate.py) if given, else the last
+    `n_dev` training examples. Returns (train, dev), with dev as (text,
+    entities) pairs like evaluation_examples()."""
+    train_data = list(train_data)
+    if dev_path is not None:
+        return train_data, list(read_examples(dev_path))
+    if not 0 < n_dev < len(train_data):
+        raise ValueError("can't hold out %d of %d training examples" %
+                         (n_dev, len(train_data)))
+    dev = [(text, annotations['entities'])
+           for text, annotations in train_data[-n_dev:]]
+    return train_data[:-n_dev], dev
+
+
+def evaluation_examples():
+    """Test.txt paired with the gold spans of EVALUATION_DATA, as a list of
+    (text, entities) tuples."""
+    fields = [('name', 'BATTLE'), ('date', 'DATE'), ('location', 'LOCATION'),
+              ('belligerent1', 'BELLIGERENT1'), ('belligerent2', 'BELLIGERENT2'),
+              ('leaders', 'LEADER'), ('result', 'RESULT')]
+    examples = []
+    for article, gold in zip(Corpus('Test.txt'), EVALUATION_DATA):
+        phrases = []
+        for field, label in fields:
+            values = gold[field]
+            if not isinstance(values, list):
+                values = [values]
+            phrases.extend((value, label) for value in values)
+        entities, _ = compile_spans(article.text, phrases)
+        examples.append((article.text, entities))
+    return examples
+
+
+def evaluate(nlp, verbose=True, examples=None):
+    """Run the model over the evaluation examples (Test.txt by default) and
+    score its spans. Returns the micro-averaged exact-match F1 as a
+    percentage."""
+    if examples is None:
+        examples = evaluation_examples()
+    scorer = Scorer()
+    if verbose:
+        print(" ")
+
+    for text, gold in examples:
+        doc = nlp(text)
+        scorer.score(gold, doc_spans(doc))
 
         #print the labeled items
+        if verbose:
+            groups = group_entities(doc)
+            print("Battle name(s): " + str(groups['battle_names']))
+
+            print("Date(s): " + str(groups['dates']))
+           
+            print("Location(s): " + str(groups['locations']))
+
+            print("Belligerents: " + str(groups['first_army']) + " VS. " + str(groups['second_army']))
+
+            print("Leader(s): " + str(groups['leaders']))
+
+            print("Result(s): " + str(groups['results']))
+
+            print("---------------------------\n")
+
+    scores = scorer.scores()
+    if verbose:
+        print_scores(scores)
+    return scores['ALL']['exact']['f'] * 100.0
+
+
+def swap_dirs(model_dir, tmp_dir):
+    """Replace `model_dir` with `tmp_dir` by renaming. If a crash comes in
+    between the renames, the old model is left in .<name>.old."""
+    old_dir = model_dir.parent / ('.%s.old' % model_dir.name)
+    if old_dir.exists():
+        shutil.rmtree(str(old_dir))
+    if not os.path.lexists(str(model_dir)):
+        os.rename(str(tmp_dir), str(model_dir))
+        return
+    os.rename(str(model_dir), str(old_dir))
+    try:
+        os.rename(str(tmp_dir), str(model_dir))
+    except OSError:
+        os.rename(str(old_dir), str(model_dir))
+        raise
+    if os.path.islink(str(old_dir)):
+        os.remove(str(old_dir))
+    else:
+        shutil.rmtree(str(old_dir))
+
+
+def save_model(nlp, output_dir, new_model_name):
+    """Write the model next to `output_dir` and swap it in, so a crash
+    while saving (a checkpoint, say) doesn't destroy the last saved one."""
+    output_dir = Path(os.path.abspath(str(output_dir)))
+    tmp_dir = output_dir.parent / ('.%s.new' % output_dir.name)
+    if tmp_dir.exists():
+        shutil.rmtree(str(tmp_dir))
+    nlp.meta['name'] = new_model_name  # rename model
+    nlp.to_disk(tmp_dir)
+    swap_dirs(output_dir, tmp_dir)
+    print("Saved model to", output_dir)
+
+
+@plac.annotations(
+    model=("Model name. Defaults to blank 'en' model.", "option", "m", str),
+    new_model_name=("New model name for model meta.", "option", "nm", str),
+    output_dir=("Optional output directory", "option", "o", Path),
+    n_iter=("Number of training iterations", "option", "n", int),
+    drop=("Dropout rate", "option", "d", float),
+    batch_start=("Initial minibatch size", "option", "bs", float),
+    batch_stop=("Maximum minibatch size", "option", "be", float),
+    batch_compound=("Minibatch size growth rate", "option", "bc", float),
+    profile_path=("Write a timing report to this .json or .csv file", "option", "p", Path),
+    eval_every=("Evaluate every N iterations (0 = only at the end)", "option", "ee", int),
+    patience=("Stop after N evaluations without improvement (0 = never)", "option", "pt", int),
+    dev_path=("Gold JSONL to evaluate on during training (default: hold out TRAIN_DATA)", "option", "dv", Path),
+    n_dev=("Training articles held out for evaluation during training", "option", "nd", int),
+    ner_profile=("NER size profile for a blank model", "option", "np", str, sorted(PROFILES)))
+
+def main(model=None, new_model_name='model', output_dir=None, n_iter=20,
+         drop=0.35, batch_start=4.0, batch_stop=32.0, batch_compound=1.001,
+         profile_path=None, eval_every=0, patience=0, dev_path=None, n_dev=2,
+         ner_profile='full'):
+    """Set up the pipeline and entity recognizer, and train the new entity."""
+    profiler = Profiler() if profile_path is not None else None
+    start = time.time()
+    nlp, optimizer = create_model(model, profile=ner_profile)
+    if profiler is not None:
+        profiler.record('load_model', time.time() - start)
+
+    def checkpoint(nlp):
+        # keep the best weights on disk as soon as they appear
+        if output_dir is not None:
+            save_model(nlp, output_dir, new_model_name)
+
+    train_data, dev = TRAIN_DATA, None
+    if eval_every:
+        train_data, dev = split_dev(TRAIN_DATA, dev_path, n_dev)
+    train(nlp, optimizer, train_data, n_iter=n_iter, drop=drop,
+          batch_start=batch_start, batch_stop=batch_stop,
+          batch_compound=batch_compound, profiler=profiler,
+          eval_every=eval_every, patience=patience, eval_examples=dev,
+          checkpoint=checkpoint)
+
+    # test the trained model on Test.txt
+    evaluate(nlp)
+
+    if profiler is not None:
+        profiler.write(profile_path)
+        print("Wrote profile to", profile_path)
 
-        print("Battle name(s): " + str(battle_names))
-
-        print("Date(s): " + str(dates))
-       
-        print("Location(s): " + str(locations))
-
-        print("Belligerents: " + str(first_army) + " VS. " + str(second_army))
-
-        print("Leader(s): " + str(leaders))
-
-        print("Result(s): " + str(results))
-
-        print("---------------------------\n")
-
-        for name in battle_names:
-            if name in evaluation_data[i]['name']:
-                accuracy += 1
-        for date in dates:
-            if date in evaluation_data[i]['date']:
-                accuracy += 1
-        for location in locations:
-            if location in evaluation_data[i]['location']:
-                accuracy += 1
-        for belligerent in  first_army:
-            if belligerent in evaluation_data[i]['belligerent1']:
-                accuracy += 1
-        for belligerent in second_army:
-            if belligerent in evaluation_data[i]['belligerent2']:
-                accuracy += 1
-        for leader in leaders:
-            for ev_leader in evaluation_data[i]['leaders']:
-                if leader in ev_leader:
-                    accuracy += 1
-        for result in results:
-            for ev_result in evaluation_data[i]['result']:
-                if result in ev_result:
-                    accuracy += 1
-
-    accuracy = (accuracy * 100.0) / 18.0
-    print("Accuracy: %.2f" %(accuracy))
-   
     # save model to output directory
     if output_dir is not None:
-        output_dir = Path(output_dir)
-        if not output_dir.exists():
-            output_dir.mkdir()
-        nlp.meta['name'] = new_model_name  # rename model
-        nlp.to_disk(output_dir)
-        print("Saved model to", output_dir)
+        save_model(nlp, output_dir, new_model_name)
 
         # test the saved model
         print("Loading from", output_dir)
         nlp2 = spacy.load(output_dir)
-        doc2 = nlp2(test_text)
+        doc2 = nlp2(Corpus('Test.txt')[0])
         for ent in doc2.ents:
             print(ent.label_, ent.text)
 
@@ -0,0 +1,111 @@
+"""Opt-in timing and memory instrumentation
+
+A Profiler collects named timings (with optional counts such as words or
+examples) and can write them out as JSON or CSV. Nothing is recorded unless
+a Profiler is passed in, so the normal training and extraction paths pay
+nothing for it.
+
+    profiler = Profiler()
+    with profiler.timer('load_model'):
+        nlp = spacy.load('Aici')
+    docs = profiled_pipe(nlp, texts, profiler)
+    profiler.write('profile.json')
+"""
+from __future__ import unicode_literals, print_function
+
+import csv
+import io
+import json
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss():
+    """Peak resident set size of this process in MB, or None if unknown."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return usage / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0)
+
+
+class Profiler(object):
+
+    def __init__(self):
+        self.events = []
+        self.totals = OrderedDict()
+
+    def record(self, name, seconds, **counts):
+        """Add one timing. Keyword arguments are counts (words, examples...)
+        that are summed per name, so rates can be computed from them."""
+        event = OrderedDict([('name', name), ('seconds', seconds)])
+        event.update(sorted(counts.items()))
+        self.events.append(event)
+        total = self.totals.setdefault(name, OrderedDict([('calls', 0),
+                                                          ('seconds', 0.0)]))
+        total['calls'] += 1
+        total['seconds'] += seconds
+        for key, value in counts.items():
+            if isinstance(value, (int, float)):
+                total[key] = total.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name, **counts):
+        start = time.time()
+        yield
+        self.record(name, time.time() - start, **counts)
+
+    def summary(self):
+        summary = OrderedDict()
+        for name, total in self.totals.items():
+            entry = OrderedDict(total)
+            seconds = total['seconds']
+            for key in ('words', 'examples', 'docs'):
+                if key in total and seconds:
+                    entry['%s_per_sec' % key] = total[key] / seconds
+            summary[name] = entry
+        return summary
+
+    def report(self):
+        return OrderedDict([('peak_rss_mb', peak_rss()),
+                            ('summary', self.summary()),
+                            ('events', self.events)])
+
+    def write(self, path):
+        """Write the report as JSON, or the events as CSV if `path` ends in
+        .csv."""
+        path = str(path)
+        if path.endswith('.csv'):
+            fields = ['name', 'seconds']
+            for event in self.events:
+                fields.extend(key for key in event if key not in fields)
+            with io.open(path, 'w', encoding='utf8', newline='') as file_:
+                writer = csv.DictWriter(file_, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(self.events)
+        else:
+            with io.open(path, 'w', encoding='utf8') as file_:
+                file_.write(json.dumps(self.report(), indent=2))
+
+
+def profiled_pipe(nlp, texts, profiler, batch_size=64):
+    """Like nlp.pipe, but times tokenization and every pipeline component
+    separately. Returns a list of Docs."""
+    texts = list(texts)
+    n_words = sum(len(text.split()) for text in texts)
+    with profiler.timer('tokenize', docs=len(texts), words=n_words):
+        docs = [nlp.make_doc(text) for text in texts]
+    for name, proc in nlp.pipeline:
+        with profiler.timer(name, docs=len(docs), words=n_words):
+            if hasattr(proc, 'pipe'):
+                docs = list(proc.pipe(docs, batch_size=batch_size))
+            else:
+                docs = [proc(doc) for doc in docs]
+    return docs
@@ -0,0 +1,201 @@
+"""Rule-based pre-pass for BATTLE and DATE entities
+
+Most battle names and dates in the articles follow a handful of patterns
+("The Battle of Waterloo", "the Siege of Yorktown", "18 June 1815",
+"September 17, 1862", "16 to 19 October 1813", "August or September
+480 BC"). They are matched with compiled regular expressions, which is far
+cheaper than finding them token by token with the statistical NER.
+
+add_rules() puts two components around the `ner` of a pipeline:
+
+* battle_rules (before ner) sets the matched spans as the document's
+  entities and remembers them as claimed
+* battle_rules_merge (after ner) puts the claimed spans back, dropping any
+  overlapping entity the NER predicted
+
+rule_pipe() also lets documents skip the statistical components when the
+caller only needs some labels and the rules already found all of them, e.g.
+building a date index from `-l BATTLE,DATE`. Long articles are cut into
+windows by extract.py before this, so covered windows are skipped too.
+
+Without a model, the coverage of the patterns on a corpus (and their
+precision and recall on gold data) can be checked with
+
+    python rules.py Training.txt Test.txt -g gold.jsonl
+"""
+from __future__ import unicode_literals, print_function
+
+import plac
+import re
+from collections import Counter
+from pathlib import Path
+
+from corpus import Corpus
+
+RULE_LABELS = ('BATTLE', 'DATE')
+
+MONTH = (r'(?:January|February|March|April|May|June|July|August|September|'
+         r'October|November|December)')
+DAY = r'\d{1,2}'
+YEAR = r'\d{1,4}(?:\s+(?:BC|BCE|AD))?'
+TO = r'(?:to|-|–|—)'
+DATE = re.compile(r'''\b(?:
+    # 16 to 19 October 1813, 23 August 1942 - 2 February 1943
+    {day}\s+(?:{to}\s+{day}\s+)?{month}\s+{year}
+        (?:\s+{to}\s+{day}\s+{month}\s+{year})?
+    # September 17, 1862
+    | {month}\s+{day},\s+{year}
+    # August or September 480 BC
+    | {month}\s+(?:or|and|{to})\s+{month}\s+{year}
+)\b'''.format(day=DAY, month=MONTH, year=YEAR, to=TO), re.VERBOSE)
+
+NAME = r"[A-Z][\w'-]*"
+BATTLE = re.compile(r'''\b(?:[Tt]he\s+)?
+    (?:(?:First|Second|Third|Fourth|Fifth)\s+)?
+    (?:Battle|Siege)\s+of\s+(?:the\s+)?
+    # up to three capitalised words: Waterloo, Little York, the Nations
+    {name}(?:\s+(?:(?:upon|on|de|la|am|an|der)\s+)?{name}){{0,2}}
+'''.format(name=NAME), re.VERBOSE)
+
+PATTERNS = [('BATTLE', BATTLE), ('DATE', DATE)]
+
+
+def find_spans(text):
+    """Non-overlapping (start, end, label) character spans matched by the
+    patterns, sorted by offset. Battle names win over dates."""
+    spans = []
+    taken = []
+    for label, pattern in PATTERNS:
+        for match in pattern.finditer(text):
+            start, end = match.span()
+            if any(start < t_end and t_start < end for t_start, t_end in taken):
+                continue
+            spans.append((start, end, label))
+            taken.append((start, end))
+    return sorted(spans)
+
+
+def _overlaps(span, others):
+    return any(span.start < other.end and other.start < span.end
+               for other in others)
+
+
+class RuleTagger(object):
+    """Pipeline component claiming the pattern matches as entities."""
+    name = 'battle_rules'
+
+    def __call__(self, doc):
+        claimed = []
+        for start, end, label in find_spans(doc.text):
+            # matches that don't fall on token boundaries are left to the NER
+            span = doc.char_span(start, end, label=label)
+            if span is not None:
+                claimed.append(span)
+        doc.user_data['rule_spans'] = [
+            (span.start_char, span.end_char, span.label_) for span in claimed]
+        doc.ents = [ent for ent in doc.ents if not _overlaps(ent, claimed)] \
+            + claimed
+        return doc
+
+    def pipe(self, docs, batch_size=64):
+        for doc in docs:
+            yield self(doc)
+
+
+class RuleMerger(object):
+    """Pipeline component restoring the claimed spans after the NER."""
+    name = 'battle_rules_merge'
+
+    def __call__(self, doc):
+        claimed = [doc.char_span(start, end, label=label) for start, end, label
+                   in doc.user_data.get('rule_spans', [])]
+        if claimed:
+            doc.ents = [ent for ent in doc.ents
+                        if not _overlaps(ent, claimed)] + claimed
+        return doc
+
+    def pipe(self, docs, batch_size=64):
+        for doc in docs:
+            yield self(doc)
+
+
+def add_rules(nlp):
+    """Add the rule components around the pipeline's `ner`."""
+    if RuleTagger.name not in nlp.pipe_names:
+        nlp.add_pipe(RuleTagger(), name=RuleTagger.name, before='ner')
+        nlp.add_pipe(RuleMerger(), name=RuleMerger.name, after='ner')
+    return nlp
+
+
+def covered(doc, labels):
+    """Whether the rules found an entity for every one of `labels`."""
+    found = set(label for start, end, label
+                in doc.user_data.get('rule_spans', []))
+    return set(labels) <= found
+
+
+def rule_pipe(nlp, texts, batch_size=64, labels=None):
+    """Like nlp.pipe for a pipeline with add_rules() applied. If `labels` is
+    given, the documents where the rules found all of them skip the
+    components between battle_rules and battle_rules_merge, and only
+    entities with those labels are kept. Returns a list of Docs."""
+    docs = [nlp.make_doc(text) for text in texts]
+    names = nlp.pipe_names
+    first = names.index(RuleTagger.name) + 1
+    last = names.index(RuleMerger.name)
+    for i, (name, proc) in enumerate(nlp.pipeline):
+        todo = docs
+        if labels and first <= i < last:
+            todo = [doc for doc in docs if not covered(doc, labels)]
+        # the components annotate the Docs in place
+        if hasattr(proc, 'pipe'):
+            for doc in proc.pipe(todo, batch_size=batch_size):
+                pass
+        else:
+            for doc in todo:
+                proc(doc)
+    if labels:
+        for doc in docs:
+            doc.ents = [ent for ent in doc.ents if ent.label_ in labels]
+    return docs
+
+
+def coverage(texts, labels=RULE_LABELS):
+    """Count the documents with a match per label, and those with a match
+    for every label (which rule_pipe would skip)."""
+    counts = Counter()
+    for text in texts:
+        found = set(label for start, end, label in find_spans(text))
+        counts['docs'] += 1
+        for label in labels:
+            if label in found:
+                counts[label] += 1
+        if set(labels) <= found:
+            counts['covered'] += 1
+    return counts
+
+
+@plac.annotations(
+    paths=("Article dumps (articles separated by --- lines)", "positional", None, Path),
+    gold_path=("Gold data in the JSONL format written by annotate.py", "option", "g", Path))
+
+def main(gold_path=None, *paths):
+    counts = coverage(article.text for path in paths
+                      for article in Corpus(path))
+    n_docs = counts['docs']
+    for key in RULE_LABELS + ('covered',):
+        print("%-8s %6d / %d articles (%.1f%%)" % (
+            key, counts[key], n_docs, 100.0 * counts[key] / n_docs
+            if n_docs else 0.0))
+    if gold_path is not None:
+        # evaluation imports extract, which imports this module
+        from evaluation import Scorer, print_scores, read_examples
+        scorer = Scorer()
+        for text, entities in read_examples(gold_path):
+            gold = [e for e in entities if e[2] in RULE_LABELS]
+            scorer.score(gold, find_spans(text))
+        print_scores(scorer.scores())
+
+
+if __name__ == '__main__':
+    plac.call(main)
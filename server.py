@@ -0,0 +1,225 @@
+"""Local extraction server
+
+Keeps the trained model in memory and answers extraction requests over HTTP
+on localhost. Concurrent requests are collected into micro-batches: the
+batcher thread waits at most `--window` milliseconds (or until `--max-batch`
+texts are queued) and runs the whole batch through `nlp.pipe` at once.
+
+    python server.py -m Aici -p 8080
+
+    POST /extract  {"text": "..."} or {"texts": ["...", "..."]}
+                   -> {"results": [{"battle_names": [...], ...}, ...]}
+    GET  /stats    -> request counts, queue depth, p50/p99 latency (ms)
+"""
+from __future__ import unicode_literals, print_function
+
+import json
+import plac
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from queue import Queue, Empty
+from socketserver import ThreadingMixIn
+
+from extract import to_record
+from snapshot import load_model
+
+
+class Job(object):
+    """A single text waiting in the queue."""
+
+    def __init__(self, text):
+        self.text = text
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class Stats(object):
+    """Request counters and a window of recent latencies."""
+
+    def __init__(self, window=10000):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.n_requests = 0
+        self.n_texts = 0
+        self.n_errors = 0
+        self.max_queue_depth = 0
+
+    def add_request(self, latency, n_texts, error=False):
+        with self.lock:
+            self.n_requests += 1
+            self.n_texts += n_texts
+            self.n_errors += int(error)
+            self.latencies.append(latency)
+
+    def add_batch(self, size, queue_depth):
+        with self.lock:
+            self.batch_sizes.append(size)
+            self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+
+    def to_dict(self, queue_depth):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            batches = list(self.batch_sizes)
+            return {
+                'requests': self.n_requests,
+                'texts': self.n_texts,
+                'errors': self.n_errors,
+                'queue_depth': queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+                'mean_batch_size': (sum(batches) / float(len(batches))
+                                    if batches else 0.0),
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+            }
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    i = int(round((pct / 100.0) * (len(sorted_values) - 1)))
+    return sorted_values[i]
+
+
+class MicroBatcher(object):
+    """Runs queued texts through the pipeline in small batches on one thread."""
+
+    def __init__(self, nlp, max_batch=32, window=0.005, stats=None):
+        self.nlp = nlp
+        self.max_batch = max_batch
+        self.window = window
+        self.stats = stats
+        self.queue = Queue()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, texts):
+        jobs = [Job(text) for text in texts]
+        for job in jobs:
+            self.queue.put(job)
+        for job in jobs:
+            job.done.wait()
+        errors = [job.error for job in jobs if job.error is not None]
+        if errors:
+            raise errors[0]
+        return [job.result for job in jobs]
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.time() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if self.stats is not None:
+                self.stats.add_batch(len(batch), self.queue.qsize())
+            try:
+                self._process(batch)
+            except Exception:
+                # find the job that broke the batch, so the others still
+                # get their results
+                for job in batch:
+                    try:
+                        self._process([job])
+                    except Exception as error:
+                        job.error = error
+            for job in batch:
+                job.done.set()
+
+    def _process(self, batch):
+        docs = self.nlp.pipe([job.text for job in batch],
+                             batch_size=len(batch))
+        for job, doc in zip(batch, docs):
+            job.result = to_record(doc)
+
+
+class ExtractionServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, batcher, stats):
+        HTTPServer.__init__(self, address, ExtractionHandler)
+        self.batcher = batcher
+        self.stats = stats
+
+
+class ExtractionHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != '/stats':
+            return self._reply(404, {'error': 'not found'})
+        queue_depth = self.server.batcher.queue.qsize()
+        self._reply(200, self.server.stats.to_dict(queue_depth))
+
+    def do_POST(self):
+        if self.path != '/extract':
+            return self._reply(404, {'error': 'not found'})
+        start = time.time()
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length).decode('utf8'))
+            texts = body['texts'] if 'texts' in body else [body['text']]
+            if not isinstance(texts, list) or \
+                    not all(isinstance(text, str) for text in texts):
+                raise TypeError(texts)
+        except (ValueError, KeyError, TypeError):
+            return self._reply(400, {'error': 'expected {"text": "..."} or '
+                                              '{"texts": ["...", ...]}'})
+        try:
+            results = self.server.batcher.submit(texts)
+        except Exception as error:
+            self.server.stats.add_request(time.time() - start, len(texts),
+                                          error=True)
+            return self._reply(500, {'error': str(error)})
+        self.server.stats.add_request(time.time() - start, len(texts))
+        self._reply(200, {'results': results})
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@plac.annotations(
+    model=("Model directory", "option", "m", str),
+    host=("Address to listen on", "option", "H", str),
+    port=("Port to listen on", "option", "p", int),
+    max_batch=("Maximum number of texts per batch", "option", "b", int),
+    window=("How long to wait for a batch to fill, in milliseconds", "option", "w", float))
+
+def main(model='Aici', host='127.0.0.1', port=8080, max_batch=32, window=5.0):
+    nlp = load_model(model)
+    print("Loaded model '%s'" % model)
+    stats = Stats()
+    batcher = MicroBatcher(nlp, max_batch=max_batch, window=window / 1000.0,
+                           stats=stats)
+    server = ExtractionServer((host, port), batcher, stats)
+    print("Listening on http://%s:%d" % (host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    plac.call(main)
@@ -0,0 +1,145 @@
+"""Model loading: lazy spaCy import and single-file snapshots
+
+spacy.load() reads the vocab, strings, tokenizer and NER weights from a
+dozen files. The extraction scripts get their model from load_model()
+instead, which only imports spaCy when a model is actually needed. If there
+is an up-to-date snapshot next to the model directory (Aici.snapshot for
+Aici/), the whole pipeline is restored from that one file. Everything is
+still loaded up front; whether the snapshot beats spacy.load() on a given
+machine is what bench_startup.py measures.
+
+A snapshot is the model's `nlp.to_bytes()` behind a small JSON header with
+its meta, pipeline and the identity of the directory it was made from (see
+cache.model_identity), so a retrained or fine-tuned model is never shadowed
+by an old snapshot; load_model() falls back to the directory instead.
+
+    python snapshot.py Aici
+    python extract.py articles/ entities.jsonl -m Aici
+
+Where processes are forked, model_pool() loads the model once before the
+workers start (with or without a snapshot), so they share it copy-on-write
+instead of each loading a copy.
+"""
+from __future__ import unicode_literals, print_function
+
+import itertools
+import json
+import multiprocessing
+import os
+import plac
+import struct
+import time
+from collections import deque
+
+from cache import model_identity
+
+MAGIC = b'IS-SNAPSHOT 1\n'
+HEADER_SIZE = struct.Struct('<I')
+SUFFIX = '.snapshot'
+
+
+def snapshot_path(model_dir):
+    return str(model_dir).rstrip('/\\') + SUFFIX
+
+
+def write_snapshot(model_dir, path=None):
+    """Write a snapshot of the model in `model_dir`. Returns its path."""
+    import spacy
+    path = path or snapshot_path(model_dir)
+    nlp = spacy.load(str(model_dir))
+    header = json.dumps({'meta': nlp.meta, 'pipeline': nlp.pipe_names,
+                         'model_id': model_identity(model_dir)})
+    header = header.encode('utf8')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file_:
+        file_.write(MAGIC)
+        file_.write(HEADER_SIZE.pack(len(header)))
+        file_.write(header)
+        file_.write(nlp.to_bytes())
+    os.rename(tmp_path, path)
+    return path
+
+
+def read_snapshot(path, model_dir=None):
+    """Restore a pipeline from a snapshot file. Returns None if `model_dir`
+    is given and has changed since the snapshot was written."""
+    with open(str(path), 'rb') as file_:
+        if file_.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a model snapshot" % path)
+        size, = HEADER_SIZE.unpack(file_.read(HEADER_SIZE.size))
+        header = json.loads(file_.read(size).decode('utf8'))
+        if model_dir is not None and \
+                header['model_id'] != model_identity(model_dir):
+            return None
+        data = file_.read()
+    from spacy.util import get_lang_class
+    meta = header['meta']
+    nlp = get_lang_class(meta['lang'])(meta=meta)
+    # the same steps as spacy.load, with bytes instead of a directory
+    for name in header['pipeline']:
+        nlp.add_pipe(nlp.create_pipe(name), name=name)
+    nlp.from_bytes(data)
+    return nlp
+
+
+def load_model(model):
+    """spacy.load(model), through the model's snapshot if it is up to date.
+    `model` may also be the path of a snapshot file."""
+    model = str(model)
+    if model.endswith(SUFFIX):
+        return read_snapshot(model)
+    path = snapshot_path(model)
+    if os.path.exists(path):
+        nlp = read_snapshot(path, model_dir=model)
+        if nlp is not None:
+            return nlp
+    import spacy
+    return spacy.load(model)
+
+
+def model_pool(n_process, initializer, initargs):
+    """A multiprocessing.Pool whose workers run `initializer(*initargs)`,
+    which loads the model. Where processes are forked it runs once here
+    instead, and the workers share the loaded model copy-on-write."""
+    if multiprocessing.get_start_method() == 'fork':
+        initializer(*initargs)
+        return multiprocessing.Pool(n_process)
+    return multiprocessing.Pool(n_process, initializer=initializer,
+                                initargs=initargs)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bounded_imap(pool, func, iterable, max_pending):
+    """Like pool.imap, but with at most `max_pending` tasks in flight, so
+    `iterable` is only read as fast as the workers get through it."""
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+@plac.annotations(
+    model=("Model directory", "positional", None, str),
+    output_path=("Snapshot file (default: <model>.snapshot)", "option", "o", str))
+
+def main(model, output_path=None):
+    path = write_snapshot(model, output_path)
+    print("Wrote %s (%.1f MB)" % (path, os.path.getsize(path) / 1024.0 ** 2))
+    start = time.time()
+    read_snapshot(path)
+    print("Loads in %.3fs" % (time.time() - start))
+
+
+if __name__ == '__main__':
+    plac.call(main)
@@ -0,0 +1,292 @@
+"""Columnar on-disk store for extracted battle records
+
+Builds a directory from the JSONL records written by extract.py, so the
+results can be queried without running the extraction again:
+
+    strings.json              every distinct string, once (the dictionary)
+    <column>.offsets/.codes   one column per entity group (battle_names,
+                              dates, ...) and for the article ids; the codes
+                              of record i are codes[offsets[i]:offsets[i + 1]]
+    index_<name>.json         sorted index keys
+    index_<name>.offsets      postings of key k are
+    index_<name>.postings     postings[offsets[k]:offsets[k + 1]]
+
+Codes, offsets and postings are arrays of unsigned 32 bit integers that are
+memory-mapped when a store is opened. There are secondary indexes on the
+words of leaders, locations and belligerents (both sides), and on the year
+of every date (negative for BC), so a query is a few binary searches and
+an intersection of sorted record id lists, read straight from the memory
+map. The index holds single words, so a query for "John Pasha" also checks
+that both words occur in the same leader.
+
+    python store.py build entities.jsonl battles.store
+    python store.py query battles.store --leader napoleon
+    python store.py query battles.store --year 1683 --location vienna
+
+`build` always writes a new store; to add records, rebuild from all of them.
+"""
+from __future__ import unicode_literals, print_function
+
+import io
+import json
+import mmap
+import os
+import plac
+import re
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+
+from extract import BUCKETS
+
+COLUMNS = ['id'] + list(BUCKETS.values())
+# index name -> columns whose values it covers
+INDEXES = {
+    'leader': ['leaders'],
+    'location': ['locations'],
+    'belligerent': ['first_army', 'second_army'],
+    'year': ['dates'],
+}
+
+WORD = re.compile(r'\w+', re.UNICODE)
+YEAR = re.compile(r'\b(\d{1,4})\b(\s*(?:BC|BCE|B\.C\.))?')
+
+
+def words(text):
+    return set(word.lower() for word in WORD.findall(text))
+
+
+def years(text):
+    """Normalised years mentioned in a date, as strings ('1815', '-480')."""
+    found = set()
+    for match in YEAR.finditer(text):
+        number = int(match.group(1))
+        # day numbers like the 18 in "18 June 1815" aren't years
+        if number < 100 and not match.group(2):
+            continue
+        found.add(str(-number if match.group(2) else number))
+    return found
+
+
+def index_keys(name, value):
+    return years(value) if name == 'year' else words(value)
+
+
+def _write_array(path, values):
+    with open(str(path), 'wb') as file_:
+        array('I', values).tofile(file_)
+
+
+def build(records, output_dir):
+    """Write a store from an iterable of extract.py records. Returns the
+    number of records."""
+    output_dir = Path(output_dir)
+    if not output_dir.exists():
+        output_dir.mkdir(parents=True)
+    strings = {}
+    columns = dict((name, (array('I', [0]), array('I'))) for name in COLUMNS)
+    postings = dict((name, defaultdict(list)) for name in INDEXES)
+
+    def encode(value):
+        code = strings.get(value)
+        if code is None:
+            code = strings[value] = len(strings)
+        return code
+
+    n_records = 0
+    for i, record in enumerate(records):
+        for name in COLUMNS:
+            values = record.get(name, [])
+            if name == 'id':
+                values = [] if values is None else [str(values)]
+            offsets, codes = columns[name]
+            codes.extend(encode(value) for value in values)
+            offsets.append(len(codes))
+        for index_name, index_columns in INDEXES.items():
+            keys = set()
+            for name in index_columns:
+                for value in record.get(name, []):
+                    keys.update(index_keys(index_name, value))
+            for key in keys:
+                postings[index_name][key].append(i)
+        n_records = i + 1
+
+    by_code = [None] * len(strings)
+    for value, code in strings.items():
+        by_code[code] = value
+    with io.open(str(output_dir / 'strings.json'), 'w', encoding='utf8') as file_:
+        file_.write(json.dumps(by_code))
+    for name, (offsets, codes) in columns.items():
+        _write_array(output_dir / ('%s.offsets' % name), offsets)
+        _write_array(output_dir / ('%s.codes' % name), codes)
+    for index_name, index in postings.items():
+        keys = sorted(index)
+        offsets = array('I', [0])
+        flat = array('I')
+        for key in keys:
+            flat.extend(index[key])
+            offsets.append(len(flat))
+        with io.open(str(output_dir / ('index_%s.json' % index_name)), 'w',
+                     encoding='utf8') as file_:
+            file_.write(json.dumps(keys))
+        _write_array(output_dir / ('index_%s.offsets' % index_name), offsets)
+        _write_array(output_dir / ('index_%s.postings' % index_name), flat)
+    return n_records
+
+
+def _intersect(lists):
+    """Record ids found in all of the sorted `lists`. Walks the shortest
+    list and binary searches the others, each from where the previous id
+    was found, so the cost depends on the shortest list."""
+    lists = sorted(lists, key=len)
+    shortest, others = lists[0], lists[1:]
+    starts = [0] * len(others)
+    result = []
+    for i in shortest:
+        for k, other in enumerate(others):
+            j = bisect_left(other, i, starts[k])
+            starts[k] = j
+            if j == len(other) or other[j] != i:
+                break
+        else:
+            result.append(i)
+    return result
+
+
+class BattleStore(object):
+    """Read-only view of a store directory. Files are opened lazily."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._arrays = {}
+        self._maps = []
+        self._strings = None
+        self._keys = {}
+
+    def _array(self, filename):
+        if filename not in self._arrays:
+            path = self.path / filename
+            if os.path.getsize(str(path)) == 0:
+                self._arrays[filename] = array('I')
+            else:
+                with open(str(path), 'rb') as file_:
+                    data = mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps.append(data)
+                self._arrays[filename] = memoryview(data).cast('I')
+        return self._arrays[filename]
+
+    @property
+    def strings(self):
+        if self._strings is None:
+            with io.open(str(self.path / 'strings.json'), encoding='utf8') as file_:
+                self._strings = json.load(file_)
+        return self._strings
+
+    def __len__(self):
+        return len(self._array('id.offsets')) - 1
+
+    def column(self, name, i):
+        offsets = self._array('%s.offsets' % name)
+        codes = self._array('%s.codes' % name)
+        return [self.strings[code] for code in codes[offsets[i]:offsets[i + 1]]]
+
+    def record(self, i):
+        record = {}
+        for name in COLUMNS:
+            values = self.column(name, i)
+            record[name] = (values[0] if values else None) if name == 'id' \
+                else values
+        return record
+
+    def postings(self, index_name, key):
+        """Sorted ids of the records with `key` in the given index."""
+        return array('I', self._postings(index_name, key))
+
+    def _postings(self, index_name, key):
+        # a view over the memory map, which mustn't outlive the query:
+        # close() can't unmap a file while views of it exist
+        if index_name not in self._keys:
+            with io.open(str(self.path / ('index_%s.json' % index_name)),
+                         encoding='utf8') as file_:
+                self._keys[index_name] = json.load(file_)
+        keys = self._keys[index_name]
+        k = bisect_left(keys, key)
+        if k == len(keys) or keys[k] != key:
+            return []
+        offsets = self._array('index_%s.offsets' % index_name)
+        postings = self._array('index_%s.postings' % index_name)
+        return postings[offsets[k]:offsets[k + 1]]
+
+    def _same_value(self, i, index_name, query_words):
+        """Whether one value of record i has all of `query_words`."""
+        return any(query_words <= words(value)
+                   for name in INDEXES[index_name]
+                   for value in self.column(name, i))
+
+    def query(self, leader=None, location=None, belligerent=None, year=None):
+        """Ids of the records matching all the given conditions. A text
+        condition matches the records whose fields of that kind contain all
+        of its words; `year` is a year like 1683, or -480 for 480 BC."""
+        conditions = []
+        phrases = []
+        for index_name, value in (('leader', leader), ('location', location),
+                                  ('belligerent', belligerent)):
+            if value:
+                value_words = words(value)
+                conditions.extend((index_name, word) for word in value_words)
+                if len(value_words) > 1:
+                    phrases.append((index_name, value_words))
+        if year is not None:
+            conditions.append(('year', str(year)))
+        if not conditions:
+            return list(range(len(self)))
+        result = _intersect([self._postings(name, key)
+                             for name, key in conditions])
+        for index_name, value_words in phrases:
+            result = [i for i in result
+                      if self._same_value(i, index_name, value_words)]
+        return result
+
+    def close(self):
+        self._arrays = {}
+        for data in self._maps:
+            data.close()
+        self._maps = []
+
+
+def read_records(path):
+    with io.open(str(path), encoding='utf8') as file_:
+        for line in file_:
+            if line.strip():
+                yield json.loads(line)
+
+
+@plac.annotations(
+    command=("What to do", "positional", None, str, ['build', 'query']),
+    path=("build: extract.py JSONL output; query: store directory", "positional", None, Path),
+    output_dir=("build: store directory to write", "positional", None, Path),
+    leader=("query: words of a leader's name", "option", "l", str),
+    location=("query: words of a location", "option", "lo", str),
+    belligerent=("query: words of a belligerent", "option", "b", str),
+    year=("query: year of the battle (negative for BC)", "option", "y", int),
+    limit=("query: maximum number of records to print", "option", "n", int))
+
+def main(command, path, output_dir=None, leader=None, location=None,
+         belligerent=None, year=None, limit=20):
+    if command == 'build':
+        if output_dir is None:
+            raise ValueError("build needs an output directory")
+        n_records = build(read_records(path), output_dir)
+        print("Wrote %d records to %s" % (n_records, output_dir))
+        return
+    store = BattleStore(path)
+    ids = store.query(leader=leader, location=location,
+                      belligerent=belligerent, year=year)
+    for i in ids[:limit]:
+        print(json.dumps(store.record(i)))
+    print("%d matching records" % len(ids))
+
+
+if __name__ == '__main__':
+    plac.call(main)
@@ -0,0 +1,117 @@
+"""Hyperparameter sweep for the battle entity recognizer
+
+Trains one blank 'en' model per (n_iter, drop) configuration, one
+configuration per worker process, and scores each of them with the
+evaluation from historical_battle.py. Configurations are ranked on a dev
+split (the last --n-dev articles of TRAIN_DATA, or --dev-path); the Test.txt
+F1 is only reported, so it stays an unbiased estimate for the winner. The
+ranked results are written to `<output_dir>/results.tsv` and only the best
+model is kept, in `<output_dir>/best`.
+
+    python sweep.py sweep_out -n 10,20,30 -d 0.0,0.2,0.35,0.5
+"""
+from __future__ import unicode_literals, print_function
+
+import os
+
+# every worker is single threaded, the parallelism comes from the processes
+for _var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(_var, '1')
+
+import itertools
+import multiprocessing
+import plac
+import random
+import shutil
+import time
+from pathlib import Path
+
+import numpy
+
+from historical_battle import (TRAIN_DATA, create_model, evaluate, split_dev,
+                               train)
+
+
+def run_config(args):
+    """Train and score a single configuration. Runs in a worker process."""
+    index, n_iter, drop, output_dir, seed, dev_path, n_dev = args
+    random.seed(seed)
+    numpy.random.seed(seed)
+    start = time.time()
+    train_data, dev = split_dev(TRAIN_DATA, dev_path, n_dev)
+    nlp, optimizer = create_model()
+    history = train(nlp, optimizer, train_data, n_iter=n_iter, drop=drop,
+                    verbose=False)
+    dev_f1 = evaluate(nlp, verbose=False, examples=dev)
+    test_f1 = evaluate(nlp, verbose=False)
+    model_dir = Path(output_dir) / ('config-%d' % index)
+    nlp.to_disk(model_dir)
+    return {'n_iter': n_iter, 'drop': drop, 'dev_f1': dev_f1,
+            'test_f1': test_f1,
+            'loss': history[-1]['losses'].get('ner', 0.0) if history else 0.0,
+            'seconds': time.time() - start, 'model_dir': str(model_dir)}
+
+
+def parse_list(value, type_):
+    return [type_(v) for v in value.split(',') if v.strip()]
+
+
+@plac.annotations(
+    output_dir=("Directory for the results table and the best model", "positional", None, Path),
+    n_iters=("Comma-separated numbers of iterations", "option", "n", str),
+    drops=("Comma-separated dropout rates", "option", "d", str),
+    n_jobs=("Number of worker processes. Defaults to all cores", "option", "j", int),
+    seed=("Random seed for every configuration", "option", "s", int),
+    dev_path=("Gold JSONL to rank on (default: hold out TRAIN_DATA)", "option", "dv", Path),
+    n_dev=("Training articles held out for ranking", "option", "nd", int))
+
+def main(output_dir, n_iters='10,20,30', drops='0.0,0.2,0.35,0.5', n_jobs=None,
+         seed=0, dev_path=None, n_dev=2):
+    output_dir = Path(output_dir)
+    if not output_dir.exists():
+        output_dir.mkdir(parents=True)
+    configs = list(itertools.product(parse_list(n_iters, int),
+                                     parse_list(drops, float)))
+    n_jobs = n_jobs or multiprocessing.cpu_count()
+    print("Sweeping %d configurations on %d processes" % (len(configs), n_jobs))
+
+    dev_path = str(dev_path) if dev_path is not None else None
+    jobs = [(i, n_iter, drop, str(output_dir), seed, dev_path, n_dev)
+            for i, (n_iter, drop) in enumerate(configs)]
+    pool = multiprocessing.Pool(min(n_jobs, len(jobs)))
+    try:
+        results = []
+        for result in pool.imap_unordered(run_config, jobs):
+            print("n_iter=%d drop=%.2f dev f1=%.2f (%.1fs)" % (
+                result['n_iter'], result['drop'], result['dev_f1'],
+                result['seconds']))
+            results.append(result)
+    finally:
+        pool.close()
+        pool.join()
+
+    # best dev F1 first, lower final loss breaks ties
+    results.sort(key=lambda r: (-r['dev_f1'], r['loss']))
+    with (output_dir / 'results.tsv').open('w') as file_:
+        file_.write('rank\tn_iter\tdrop\tdev_f1\ttest_f1\tloss\tseconds\n')
+        for rank, r in enumerate(results, 1):
+            file_.write('%d\t%d\t%.2f\t%.2f\t%.2f\t%.4f\t%.1f\n' % (
+                rank, r['n_iter'], r['drop'], r['dev_f1'], r['test_f1'],
+                r['loss'], r['seconds']))
+
+    best_dir = output_dir / 'best'
+    if best_dir.exists():
+        shutil.rmtree(str(best_dir))
+    shutil.move(results[0]['model_dir'], str(best_dir))
+    for r in results[1:]:
+        shutil.rmtree(r['model_dir'], ignore_errors=True)
+
+    best = results[0]
+    print("Best: n_iter=%d drop=%.2f dev f1=%.2f test f1=%.2f" % (
+        best['n_iter'], best['drop'], best['dev_f1'], best['test_f1']))
+    print("Results written to", output_dir / 'results.tsv')
+    print("Best model saved to", best_dir)
+
+
+if __name__ == '__main__':
+    plac.call(main)
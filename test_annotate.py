@@ -0,0 +1,24 @@
+from __future__ import unicode_literals, print_function
+
+from annotate import compile_spans
+
+
+def test_compile_spans():
+    text = 'The Battle of Vienna was fought near Kahlenberg by Sobieski.'
+    entities, problems = compile_spans(text, [
+        ('The Battle of Vienna', 'BATTLE'), ('Vienna', 'LOCATION'),
+        ('Kahlenberg', 'LOCATION'), ('Kara Mustafa', 'LEADER')])
+    assert entities == [(0, 20, 'BATTLE'), (37, 47, 'LOCATION')]
+    assert "not found: 'Kara Mustafa'" in problems
+    assert any(problem.startswith('overlap:') for problem in problems)
+
+
+def test_compile_spans_ignore_case_keeps_offsets():
+    # 'İ'.lower() is two characters, which shifted every later span
+    text = 'Sultan İbrahim fought at Vienna with Kara Mustafa.'
+    entities, problems = compile_spans(text, [
+        ('Kara Mustafa', 'LEADER'), ('vienna', 'LOCATION')],
+        ignore_case=True)
+    assert problems == []
+    assert [(text[start:end], label) for start, end, label in entities] == \
+        [('Vienna', 'LOCATION'), ('Kara Mustafa', 'LEADER')]
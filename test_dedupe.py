@@ -0,0 +1,56 @@
+from __future__ import unicode_literals
+
+from collections import Counter
+
+from dedupe import belligerent_key, cluster, leader_key
+
+
+def groups(clusters):
+    return sorted(sorted(c['mentions']) for c in clusters)
+
+
+def test_cluster_leaders():
+    mentions = Counter({
+        'King of Poland John III Sobieski': 2,
+        'John III Sobieski': 1,
+        'Grand Vizier Merzifonlu Kara Mustafa Pasha': 1,
+        'Kara Mustafa Pasha': 1,
+        'Napoleon Bonaparte': 3,
+        'Louis Napoleon': 1,
+        'Napoleon': 1,
+        'Saigo': 1,
+        'Saigo Takamori': 1,
+    })
+    clusters = cluster(mentions, leader_key, 'L')
+    assert groups(clusters) == [
+        ['Grand Vizier Merzifonlu Kara Mustafa Pasha', 'Kara Mustafa Pasha'],
+        ['John III Sobieski', 'King of Poland John III Sobieski'],
+        ['Louis Napoleon'],
+        ['Napoleon'],
+        ['Napoleon Bonaparte'],
+        ['Saigo', 'Saigo Takamori'],
+    ]
+    first = clusters[0]
+    assert first['id'] == 'L1'
+    assert first['name'] == 'King of Poland John III Sobieski'
+    assert first['count'] == 3
+
+
+def test_cluster_belligerents():
+    mentions = Counter({
+        'French army': 2,
+        'France': 1,
+        'Polish-Austrian-German forces': 1,
+        'German forces': 1,
+        'Austrian Empire': 1,
+        'Ottoman Empire': 1,
+        'the Ottoman army': 1,
+    })
+    clusters = cluster(mentions, belligerent_key, 'B')
+    assert groups(clusters) == [
+        ['Austrian Empire'],
+        ['France', 'French army'],
+        ['German forces'],
+        ['Ottoman Empire', 'the Ottoman army'],
+        ['Polish-Austrian-German forces'],
+    ]
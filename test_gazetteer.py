@@ -0,0 +1,26 @@
+from __future__ import unicode_literals
+
+from gazetteer import NATION, NATIONALITY, Gazetteer, build
+
+
+def make_gazetteer(tmp_path):
+    path = str(tmp_path / 'gazetteer.bin')
+    build(path)
+    return Gazetteer(path)
+
+
+def test_lookup_on_fresh_instance(tmp_path):
+    gazetteer = make_gazetteer(tmp_path)
+    assert gazetteer.lookup('French') == (NATIONALITY, 'France')
+    assert gazetteer.lookup('  FRANCE ') == (NATION, 'France')
+    assert gazetteer.lookup('Qwertyland') is None
+
+
+def test_match_tokens_on_fresh_instance(tmp_path):
+    gazetteer = make_gazetteer(tmp_path)
+    words = 'the French and the Soviet Union armies'.split()
+    assert list(gazetteer.match_tokens(words)) == [
+        (1, 2, NATIONALITY, 'France'),
+        (4, 6, NATION, 'Soviet Union'),
+    ]
+    assert gazetteer.max_tokens >= 2
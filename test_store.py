@@ -0,0 +1,38 @@
+from __future__ import unicode_literals, print_function
+
+from store import BattleStore, build
+
+RECORDS = [
+    {'id': 'vienna', 'leaders': ['John III Sobieski', 'Kara Mustafa Pasha'],
+     'locations': ['Vienna'], 'dates': ['September 12, 1683'],
+     'first_army': ['Polish-Austrian-German forces'],
+     'second_army': ['Ottoman Empire']},
+    {'id': 'waterloo', 'leaders': ['Napoleon', 'Duke of Wellington'],
+     'locations': ['Waterloo'], 'dates': ['18 June 1815'],
+     'first_army': ['French army'], 'second_army': ['Seventh Coalition']},
+    {'id': 'austerlitz', 'leaders': ['Napoleon', 'Kutuzov'],
+     'locations': ['Austerlitz'], 'dates': ['2 December 1805'],
+     'first_army': ['French army'], 'second_army': ['Russian Empire']},
+]
+
+
+def test_query(tmp_path):
+    build(RECORDS, tmp_path)
+    store = BattleStore(tmp_path)
+    try:
+        assert store.query(leader='Napoleon') == [1, 2]
+        assert store.query(leader='Napoleon', year=1805) == [2]
+        assert store.query(leader='Kara Mustafa') == [0]
+        # words of two different leaders don't make a match
+        assert store.query(leader='John Pasha') == []
+        assert store.record(1)['id'] == 'waterloo'
+    finally:
+        store.close()
+
+
+def test_close_with_postings_held(tmp_path):
+    build(RECORDS, tmp_path)
+    store = BattleStore(tmp_path)
+    ids = store.postings('leader', 'napoleon')
+    store.close()
+    assert list(ids) == [1, 2]
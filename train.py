@@ -28,9 +28,9 @@ import random
 from pathlib import Path
 import spacy
 
-train_text = []
-with open('Training.txt', 'r') as myfile:
-    train_text = myfile.read().replace('\n', '').split('---')
+from corpus import Corpus, from_stripped_offsets
+
+train_text = Corpus('Training.txt')
 
 # new entity labels
 LABEL1 = 'BELLIGERENT'
@@ -51,6 +51,10 @@ TRAIN_DATA = [
      (train_text[7], {'entities': [(0, 20, 'BATTLE'), (35, 46, 'DATE'), (48, 67, 'BELLIGERENT'), (75, 118, 'LEADER'), (166, 196, 'LEADER'), (198, 215, 'BELLIGERENT')]})
     ]
 
+# the offsets above were counted on the articles with their newlines removed
+TRAIN_DATA = [(text, {'entities': from_stripped_offsets(text, annotations['entities'])})
+              for text, annotations in TRAIN_DATA]
+
 @plac.annotations(
     model=("Model name. Defaults to blank 'en' model.", "option", "m", str),
     new_model_name=("New model name for model meta.", "option", "nm", str),